@@ -8,7 +8,9 @@
 """
 
 # Standard modules
+import sys
 import warnings
+import _thread
 
 __author__ = 'Frank Brehm <frank@brehm-online.com>'
 __copyright__ = '(C) 2015 by Frank Brehm, Berlin'
@@ -29,10 +31,49 @@ CNT_F_OLD = 0x02
 CNT_F_REGION = 0x04
 CNT_F_ANY = CNT_F_REGULAR | CNT_F_OLD | CNT_F_REGION
 
-_country = []
-_two_letter = {}
-_three_letter = {}
-_numeric = {}
+# The top level regions (continents) of UN M49, see _m49_tree
+_M49_CONTINENTS = (2, 19, 142, 150, 9)
+
+# The current Registry snapshot, built from _cdata on first use (see
+# _build_registry()) and replaced as a whole by reload().
+_registry = None
+_registry_lock = _thread.allocate_lock()
+
+# Former module globals of the registry and their Registry attributes
+_REGISTRY_NAMES = {
+    '_country': 'countries', '_two_letter': 'two_letter',
+    '_three_letter': 'three_letter', '_numeric': 'numeric', '_lookup': 'lookup'}
+
+_VALID_FLAGS = frozenset((CNT_F_REGULAR, CNT_F_OLD, CNT_F_REGION, CNT_F_ANY))
+
+# Bounded CLOCK cache of raw keys not found directly in the lookup table,
+# the cache itself belongs to the Registry snapshot
+_CACHE_DEFAULT_SIZE = 4096
+_cache_maxsize = _CACHE_DEFAULT_SIZE
+_cache_hits = 0
+_cache_misses = 0
+_cache_lock = _thread.allocate_lock()
+
+# Instrumentation of country(), see enable_stats()
+_STATS_PATHS = ('numeric', 'alpha2', 'alpha3', 'other')
+_STATS_OUTCOMES = ('hit', 'miss', 'filtered')
+_STATS_BUCKETS = (1e-07, 2.5e-07, 5e-07, 1e-06, 2.5e-06, 5e-06, 1e-05, 1e-04)
+_stats = None
+_stats_enabled = False
+
+# Name of the Country property for every CNT_I_* field index
+_FIELD_ATTRIBUTES = ('two_letter', 'three_letter', 'numcode', 'name', 'flag')
+
+# Number of slots of the dense tables of numeric codes
+_NUMCODE_SLOTS = 1000
+
+# Default of the probes of the convert tables, which have None values
+_MISSING = object()
+
+# Memory-mapped tables of localized names, loaded on first use of a locale
+_locale_path = None
+_locales = {}
+_locale_lock = _thread.allocate_lock()
 
 
 # =============================================================================
@@ -41,6 +82,8 @@ class Country(object):
     Class for data of a country.
     """
 
+    __slots__ = ('_name', '_two_letter', '_three_letter', '_numcode', '_flag')
+
     # -------------------------------------------------------------------------
     def __init__(
         self, name, two_letter=None, three_letter=None,
@@ -84,143 +127,1874 @@ class Country(object):
         """A flag describing the type of country."""
         return self._flag
 
+    # -------------------------------------------------------------------------
+    def localized_name(self, locale):
+        """
+        The name of the country in the given locale (e.g. 'de' or 'pt_BR'),
+        or the English name, if there is no name in this locale.
+        """
+        return _localized_name(self, locale)
+
+    # -------------------------------------------------------------------------
+    def __reduce__(self):
+        """
+        Pickles a country of the registry as a reference (its code and
+        flag), which is unpickled to the country of the registry of the
+        receiving process, all other countries with all their data.
+        """
+
+        key = _reference_key(self)
+        if key is not None:
+            reg = registry()
+            index = _find_index(reg, key, self._flag)
+            if index is not None and reg.countries[index] is self:
+                return (_country_reference, (key, self._flag))
+        return (Country, (
+            self._name, self._two_letter, self._three_letter, self._numcode,
+            self._flag))
+
+
+# =============================================================================
+def _reference_key(c):
+    """
+    Returns the key of the given country for pickling it as a reference:
+    the 3-letter code, the numeric code or the 2-letter code, or None.
+    """
+
+    if c.three_letter:
+        return c.three_letter
+    if c.numcode is not None:
+        return c.numcode
+    return c.two_letter
+
 
 # =============================================================================
-def country(key, flags=CNT_F_ANY):
+def _country_reference(key, flag):
+    """Unpickles a reference to a country of the registry."""
+
+    reg = registry()
+    index = _find_index(reg, key, flag)
+    if index is None:
+        raise ValueError("Country %r is not in the registry." % (key, ))
+    return reg.countries[index]
+
 
-    if flag not in (CNT_F_REGULAR, CNT_F_OLD, CNT_F_REGION, CNT_F_ANY):
-        raise ValueError("Invalid flags %r for a country.", flags)
+# =============================================================================
+class CacheInfo(tuple):
+    """
+    Statistics of the key cache in the manner of
+    functools.lru_cache().cache_info().
+    """
 
-    index = None
+    __slots__ = ()
 
-    # Pseudo-loop to find the country index
-    while True:
+    # -------------------------------------------------------------------------
+    def __new__(cls, hits, misses, maxsize, currsize):
+        return tuple.__new__(cls, (hits, misses, maxsize, currsize))
+
+    # -------------------------------------------------------------------------
+    def __repr__(self):
+        return "CacheInfo(hits=%r, misses=%r, maxsize=%r, currsize=%r)" % self
+
+    hits = property(lambda self: self[0], doc="Number of cache hits.")
+    misses = property(lambda self: self[1], doc="Number of cache misses.")
+    maxsize = property(lambda self: self[2], doc="Maximum size of the cache.")
+    currsize = property(lambda self: self[3], doc="Current size of the cache.")
+
+
+# =============================================================================
+class InvalidValue(tuple):
+    """
+    Entry of the report of validate() for a value, which could not be
+    resolved: the number of its occurrences and its first position.
+    """
+
+    __slots__ = ()
+
+    # -------------------------------------------------------------------------
+    def __new__(cls, count, first):
+        return tuple.__new__(cls, (count, first))
+
+    # -------------------------------------------------------------------------
+    def __repr__(self):
+        return "InvalidValue(count=%r, first=%r)" % self
+
+    count = property(lambda self: self[0], doc="Number of occurrences.")
+    first = property(lambda self: self[1], doc="Position of the first occurrence.")
+
+
+# =============================================================================
+class Registry(object):
+    """
+    Immutable snapshot of the registry with all its indexes.
+
+    All lookups read the current snapshot once through the module global
+    _registry, reload() builds a new snapshot off to the side and replaces
+    it with a single assignment, so readers never see half-built indexes.
+
+    The countries and their code tuples are tuples, the indexes two_letter,
+    three_letter, numeric and lookup read-only mappings. The derived
+    structures (e.g. the lookup tables per flags, which share the dict
+    behind lookup, or the trigram index of the names) are private slots,
+    added on demand and each assigned at once after it is complete.
+    """
+
+    __slots__ = (
+        'countries', 'codes', 'two_letter', 'three_letter', 'numeric', 'lookup',
+        '_lookups', '_flag_countries', '_cache', '_numeric_arrays',
+        '_convert_tables', '_name_index', '_name_lookups', '_prefix_indexes',
+        '_region_index', '_region_maps', '_region_sets', '_successor_index',
+        '_sort_orders')
+
+    # -------------------------------------------------------------------------
+    def __init__(self, rows, indexes=None):
+        """
+        Builds all indexes from the given rows (2-letter code, 3-letter
+        code, numeric code, name, flag), for duplicate codes the first
+        country is kept. indexes may be the tuple of the dicts two_letter,
+        three_letter, numeric and lookup already built for the same rows,
+        e.g. from a compiled cache (see compile_registry()).
+        """
+
+        countries = tuple(
+            Country(data[3], data[0] or None, data[1] or None, data[2], data[4])
+            for data in rows)
+        if indexes is None:
+            indexes = _build_indexes(countries)
+        two_letter, three_letter, numeric, lookup = indexes
+
+        from types import MappingProxyType
+
+        self.countries = countries
+        self.codes = tuple(
+            (c.two_letter, c.three_letter, c.numcode, c.name, c.flag)
+            for c in countries)
+        self.two_letter = MappingProxyType(two_letter)
+        self.three_letter = MappingProxyType(three_letter)
+        self.numeric = MappingProxyType(numeric)
+        self.lookup = MappingProxyType(lookup)
+        # the lookups themselves probe the dicts without the proxy
+        self._lookups = {CNT_F_ANY: lookup}
+        self._flag_countries = {}
+        self._cache = {} if _cache_maxsize else None
+
+        self._numeric_arrays = {}
+        self._convert_tables = {}
+        self._name_index = None
+        self._name_lookups = {}
+        self._prefix_indexes = {}
+        self._region_index = None
+        self._region_maps = {}
+        self._region_sets = {}
+        self._successor_index = None
+        self._sort_orders = {}
+
+    # -------------------------------------------------------------------------
+    def __len__(self):
+        return len(self.countries)
+
+    # -------------------------------------------------------------------------
+    def __iter__(self):
+        return iter(self.countries)
 
-        # key is an integer value - search in _numeric
-        if isinstance(key, int):
-            if key in _numeric:
-                index = _numeric[key]
-            break
 
-        # key is a string with a numeric content
+# =============================================================================
+def _build_indexes(countries):
+    """
+    Builds the dicts two_letter, three_letter and numeric of the lower case
+    codes and the numeric codes to the indexes of the given countries and
+    the normalized lookup table of all their keys (see _lookup_keys()),
+    for duplicate codes the first country is kept.
+    """
+
+    two_letter = {}
+    three_letter = {}
+    numeric = {}
+    lookup = {}
+
+    for index, c in enumerate(countries):
+        if c.two_letter:
+            two_letter.setdefault(c.two_letter.lower(), index)
+        if c.three_letter:
+            three_letter.setdefault(c.three_letter.lower(), index)
+        if c.numcode is not None:
+            numeric.setdefault(c.numcode, index)
+
+        for key in _lookup_keys(c):
+            if key not in lookup:
+                lookup[key] = index
+
+    return (two_letter, three_letter, numeric, lookup)
+
+
+# =============================================================================
+def _check_flags(flags):
+
+    if flags not in _VALID_FLAGS:
+        raise ValueError("Invalid flags %r for a country." % (flags))
+
+
+# =============================================================================
+def _lookup_keys(c):
+    """
+    Generates all keys of the given country for the normalized lookup
+    table _lookup in the order of their priority: the numeric code as
+    an integer and as a string (also zero padded to three digits) and
+    the 2-letter and 3-letter codes in lower, upper and title case,
+    followed by all these strings as ASCII bytes.
+    """
+
+    codes = []
+    if c.numcode is not None:
+        yield c.numcode
+        codes.append(str(c.numcode))
+        codes.append('%03d' % (c.numcode))
+
+    for code in (c.two_letter, c.three_letter):
+        if code:
+            codes.append(code.lower())
+            codes.append(code.upper())
+            codes.append(code.title())
+
+    for code in codes:
+        yield code
+    for code in codes:
+        yield code.encode('ascii')
+
+
+# =============================================================================
+def _is_numeric(str_key):
+    """
+    Checks without raising an exception, whether int() could convert
+    the given stripped string.
+    """
+
+    if str_key[:1] in ('+', '-'):
+        str_key = str_key[1:]
+    if '_' in str_key:
+        str_key = str_key.replace('_', '')
+    return str_key.isdecimal()
+
+
+# =============================================================================
+def _hashable_key(key):
+    """
+    Returns a bytes copy of a key, which cannot be hashed, but is a byte
+    buffer (bytearray or a writable memoryview).
+    """
+
+    if isinstance(key, (bytearray, memoryview)):
+        return bytes(key)
+    raise TypeError("Invalid key %r for a country." % (key, ))
+
+
+# =============================================================================
+def _normal_key(key):
+    """
+    Normalizes a key, which was not found directly in a lookup table,
+    e.g. a key with surrounding whitespace or in an unusual case, into
+    the form of the keys of the lookup tables: the numeric code as an
+    integer or the lower case code as string or bytes.
+    Returns None, if the key cannot be a key of a country.
+    """
+
+    # key is an integer value - all numeric codes are in the lookup table
+    if isinstance(key, int):
+        return None
+
+    if isinstance(key, str):
+        str_key = key.strip()
+        if not _is_numeric(str_key):
+            return str_key.lower()
+        # Only some misplaced underscores may still fail here
         try:
-            int_key = int(key)
-            if int_key in _numeric:
-                index = _numeric[int_key]
-            break
+            return int(str_key)
         except ValueError:
-            pass
+            return None
 
-        str_key = str(key).strip().lower()
+    # ASCII codes as bytes, bytearray or memoryview, without decoding
+    if isinstance(key, (bytes, bytearray, memoryview)):
+        bytes_key = bytes(key).strip()
+        digits = bytes_key[1:] if bytes_key[:1] in (b'+', b'-') else bytes_key
+        if digits.isdigit():
+            return int(bytes_key)
+        return bytes_key.lower()
 
-        if str_key in _two_letter:
-            index = _two_letter[str_key]
-            break
+    # Any other type, e.g. float or bytes with a numeric content
+    try:
+        return int(key)
+    except ValueError:
+        pass
+
+    return str(key).strip().lower()
+
+
+# =============================================================================
+def _normal_key_cached(reg, key):
+    """
+    Like _normal_key(), but remembers the result for the raw key (also
+    if it is None) in the bounded cache of reg. The normalized key does
+    not depend on the flags, so one cache serves the lookup tables of all
+    flags.
+
+    The cache uses the CLOCK algorithm: a hit only marks its entry as
+    referenced without any locking, on eviction referenced entries get
+    a second chance and are moved to the end.
+    """
+
+    global _cache_hits, _cache_misses
+
+    # Never keep a buffer alive or cache a mutable key
+    if isinstance(key, (bytearray, memoryview)):
+        key = bytes(key)
+
+    cache = reg._cache
+    if cache is None:
+        return _normal_key(key)
+
+    entry = cache.get(key)
+    if entry is not None:
+        entry[1] = True
+        _cache_hits += 1
+        return entry[0]
+
+    normal = _normal_key(key)
+
+    with _cache_lock:
+        _cache_misses += 1
+        while len(cache) >= _cache_maxsize:
+            old_key = next(iter(cache))
+            old_entry = cache.pop(old_key)
+            if old_entry[1]:
+                old_entry[1] = False
+                cache[old_key] = old_entry
+        cache[key] = [normal, False]
+
+    return normal
+
+
+# =============================================================================
+def _get_lookup(reg, flags):
+    """
+    Returns the lookup table of reg for the countries matching flags,
+    built like the table of CNT_F_ANY, but only from these countries. So
+    e.g. the historic code 180 reaches Zaire with CNT_F_OLD, although
+    the current Democratic Republic of the Congo has the same code.
+    """
+
+    lookup = reg._lookups.get(flags)
+    if lookup is None:
+        _check_flags(flags)
+        lookup = {}
+        for index, c in enumerate(reg.countries):
+            if flags & c.flag:
+                for key in _lookup_keys(c):
+                    if key not in lookup:
+                        lookup[key] = index
+        reg._lookups[flags] = lookup
+
+    return lookup
 
-        if str_key in _three_letter:
-            index = _three_letter[str_key]
 
-        # At the end break the pseudo-loop
-        break
+# =============================================================================
+def cache_info():
+    """
+    Returns the statistics of the cache of raw keys, which could not be
+    found directly in the lookup table (e.g. ' de ' or 'Deu').
+    """
+
+    reg = _registry
+    with _cache_lock:
+        currsize = 0 if reg is None or reg._cache is None else len(reg._cache)
+        return CacheInfo(_cache_hits, _cache_misses, _cache_maxsize, currsize)
+
+
+# =============================================================================
+def cache_clear():
+    """Clears the cache of raw keys and its statistics."""
+
+    global _cache_hits, _cache_misses
+
+    reg = _registry
+    with _cache_lock:
+        if reg is not None and reg._cache is not None:
+            reg._cache = {}
+        _cache_hits = 0
+        _cache_misses = 0
+
+
+# =============================================================================
+def set_cache_size(maxsize=_CACHE_DEFAULT_SIZE):
+    """
+    Sets the maximum number of raw keys in the cache, 0 disables the cache.
+    The cache is cleared.
+    """
+
+    global _cache_maxsize, _cache_hits, _cache_misses
+
+    maxsize = int(maxsize)
+    if maxsize < 0:
+        raise ValueError("Invalid cache size %r." % (maxsize))
 
+    reg = _registry
+    with _cache_lock:
+        _cache_maxsize = maxsize
+        if reg is not None:
+            reg._cache = {} if maxsize else None
+        _cache_hits = 0
+        _cache_misses = 0
+
+
+# =============================================================================
+def _find_index(reg, key, flags=CNT_F_ANY):
+    """
+    Searches the index of the given key in the countries of the Registry
+    reg matching flags. Returns None, if the key could not be found.
+    """
+
+    lookup = reg._lookups.get(flags)
+    if lookup is None:
+        lookup = _get_lookup(reg, flags)
+
+    try:
+        index = lookup.get(key)
+    except (TypeError, ValueError):
+        index = None
     if index is None:
-        return None
+        index = _probe(reg, lookup, key)
+    return index
 
-    c = _country[index]
-    result_flag = flags & c.flag
-    if not result_flag:
+
+# =============================================================================
+def _probe(reg, table, key):
+    """
+    Continues the lookup of a key, which was not found directly in a table
+    keyed like the lookup tables (see _lookup_keys()) or could not be
+    hashed: probes a byte buffer as bytes and finally the normalized key.
+    Returns the value found or None.
+    """
+
+    cls = key.__class__
+    # all numeric codes are in the tables
+    if cls is int:
+        return None
+    if cls.__hash__ is None or cls is memoryview:
+        key = _hashable_key(key)
+        value = table.get(key)
+        if value is not None:
+            return value
+    normal = _normal_key_cached(reg, key)
+    if normal is None:
         return None
+    return table.get(normal)
+
+
+# =============================================================================
+def country(key, flags=CNT_F_ANY, resolve_historic=False):
+    """
+    Returns the Country object for the given key (numeric code as integer
+    or string, 2-letter or 3-letter code, also as ASCII bytes, bytearray
+    or memoryview) of the type given by flags, or None, if it could not
+    be found. Every flags value has its own lookup table, so e.g.
+    country(180, CNT_F_OLD) is Zaire and country(180) the Democratic
+    Republic of the Congo.
+
+    With resolve_historic a historic country (CNT_F_OLD) is resolved to
+    its current successor, or to a tuple of all successors, if it was
+    split up (e.g. 810 for the USSR). Historic countries without a known
+    successor are returned unchanged.
+    """
+
+    reg = _registry
+    if reg is None:
+        reg = _build_registry()
+
+    lookup = reg._lookups.get(flags)
+    if lookup is None:
+        lookup = _get_lookup(reg, flags)
+
+    if _stats_enabled:
+        return _stats.country(reg, lookup, key, flags, resolve_historic)
+
+    try:
+        index = lookup.get(key)
+    except (TypeError, ValueError):
+        index = None
+    if index is None:
+        index = _probe(reg, lookup, key)
+        if index is None:
+            return None
+
+    c = reg.countries[index]
+    if resolve_historic and c.flag == CNT_F_OLD:
+        successors = _get_successor_index(reg)[0][index]
+        return successors[0] if len(successors) == 1 else successors
 
     return c
 
 
 # =============================================================================
-_cdata = (
-    ('AF', 'AFG',   4, 'Afghanistan'),
-    ('AL', 'ALB',   8, 'Albania'),
-    ('DZ', 'DZA',  12, 'Algeria'),
-    ('AS', 'ASM',  16, 'American Samoa'),
-    ('AD', 'AND',  20, 'Andorra'),
-    ('AO', 'AGO',  24, 'Angola'),
-    ('AI', 'AIA', 660, 'Anguilla'),
-    ('AQ', None, None, 'Antarctica'),
-    ('AG', 'ATG',  28, 'Antigua and Barbuda'),
-    (None, None,  896, 'Areas not elsewhere specified'),
-    (None, None,  898, 'Areas not specified'),
-    ('AR', 'ARG',  32, 'Argentina'),
-    ('AM', 'ARM',  51, 'Armenia'),
-    ('AW', 'ABW', 533, 'Aruba'),
-    ('AU', 'AUS',  36, 'Australia'),
-    ('AT', 'AUT',  40, 'Austria'),
-    ('AZ', 'AZE',  31, 'Azerbaijan'),
-    ('BS', 'BHS',  44, 'Bahamas'),
-    ('BH', 'BHR',  48, 'Bahrain'),
-    ('BD', 'BGD',  50, 'Bangladesh'),
-    ('BB', 'BRB',  52, 'Barbados'),
-    ('BY', 'BLR', 112, 'Belarus'),
-    ('BE', 'BEL',  56, 'Belgium'),
-    ('BZ', 'BLZ',  84, 'Belize'),
-    ('BJ', 'BEN', 204, 'Benin'),
-    ('BM', 'BMU',  60, 'Bermuda'),
-    ('BT', 'BTN',  64, 'Bhutan'),
-    ('BO', 'BOL',  68, 'Bolivia'),
-    ('BA', 'BIH',  70, 'Bosnia and Herzegovina'),
-    ('BW', 'BWA',  72, 'Botswana'),
-    ('BV', None, None, 'Bouvet Island'),
-    ('BR', 'BRA',  76, 'Brazil'),
-    ('IO', None, None, 'British Indian Ocean Territory'),
-    ('VG', 'VGB',  92, 'British Virgin Islands'),
-    ('BN', 'BRN',  96, 'Brunei Darussalam'),
-    ('BG', 'BGR', 100, 'Bulgaria'),
-    ('BF', 'BFA', 854, 'Burkina Faso'),
-    ('BI', 'BDI', 108, 'Burundi'),
-    ('KH', 'KHM', 116, 'Cambodia'),
-    ('CM', 'CMR', 120, 'Cameroon'),
-    ('CA', 'CAN', 124, 'Canada'),
-    ('CV', 'CPV', 132, 'Cape Verde'),
-    ('KY', 'CYM', 136, 'Cayman Islands'),
-    ('CF', 'CAF', 140, 'Central African Republic'),
-    ('TD', 'TCD', 148, 'Chad'),
-    (None, None,  830, 'Channel Islands'),
-    ('CL', 'CHL', 152, 'Chile'),
-    ('CN', 'CHN', 156, 'China'),
-    ('CX', None, None, 'Christmas Island'),
-    ('CC', None, None, 'Cocos (keeling) Islands'),
-    ('CO', 'COL', 170, 'Colombia'),
-    ('KM', 'COM', 174, 'Comoros'),
-    ('CG', 'COG', 178, 'Congo'),
-    ('CK', 'COK', 184, 'Cook Islands'),
-    ('CR', 'CRI', 188, 'Costa Rica'),
-    ('CI', 'CIV', 384, 'Côte d\'Ivoire'),
-    ('HR', 'HRV', 191, 'Croatia'),
-    ('CU', 'CUB', 192, 'Cuba'),
-    ('CY', 'CYP', 196, 'Cyprus'),
-    ('CZ', 'CZE', 203, 'Czech Republic'),
-    ('KP', 'PRK', 408, 'Democratic People\'s Republic of Korea'),
-    ('CD', 'COD', 180, 'Democratic Republic of the Congo'),
-    ('DK', 'DNK', 208, 'Denmark'),
-    ('DJ', 'DJI', 262, 'Djibouti'),
-    ('DM', 'DMA', 212, 'Dominica'),
-    ('DO', 'DOM', 214, 'Dominican Republic'),
-    ('TP', 'TMP', 626, 'East Timor'),
-    ('EC', 'ECU', 218, 'Ecuador'),
-    ('EG', 'EGY', 818, 'Egypt'),
-    ('SV', 'SLV', 222, 'El Salvador'),
-    ('GQ', 'GNQ', 226, 'Equatorial Guinea'),
-    ('ER', 'ERI', 232, 'Eritrea'),
-    ('EE', 'EST', 233, 'Estonia'),
-    ('ET', 'ETH', 231, 'Ethiopia'),
-    ('FO', 'FRO', 234, 'Faeroe Islands'),
-    ('FK', 'FLK', 238, 'Falkland Islands (Malvinas)'),
-    ('FM', 'FSM', 583, 'Micronesia, Federated States of'),
-    ('FJ', 'FJI', 242, 'Fiji'),
-    ('FI', 'FIN', 246, 'Finland'),
-    ('MK', 'MKD', 807, 'The former Yugoslav Republic of Macedonia'),
-    ('FR', 'FRA', 250, 'France'),
-    ('GF', 'GUF', 254, 'French Guiana'),
-    ('PF', 'PYF', 258, 'French Polynesia'),
-    ('TF', None, None, 'French Southern Territories'),
-    ('GA', 'GAB', 266, 'Gabon'),
+def country_codes(key, flags=CNT_F_ANY):
+    """
+    Returns the tuple (2-letter code, 3-letter code, numeric code, name,
+    flag) of the country for the given key (see country()), to be indexed
+    by the CNT_I_* constants, or None, if it could not be found.
+
+    The tuples are built once with the registry and shared by all callers,
+    so no object is created, e.g. for writing CSV or database rows.
+    """
+
+    reg = _registry
+    if reg is None:
+        reg = _build_registry()
+
+    index = _find_index(reg, key, flags)
+    if index is None:
+        return None
+    return reg.codes[index]
+
+
+# =============================================================================
+def country_codes_all(keys, flags=CNT_F_ANY):
+    """
+    Returns the list of the shared tuples of country_codes() for the given
+    keys (None for keys, which could not be found). NumPy integer arrays
+    are looked up vectorized.
+    """
+
+    _check_flags(flags)
+    reg = _registry
+    if reg is None:
+        reg = _build_registry()
+
+    indexes = _countries(reg, keys, flags, True)
+    if not isinstance(indexes, list):
+        indexes = indexes.ravel().tolist()
+    codes = reg.codes
+    return [codes[i] if i >= 0 else None for i in indexes]
+
+
+# =============================================================================
+class _LookupStats(object):
+    """
+    Counters of country() by the kind of the key (path) and the outcome,
+    with the latency of every sample_every-th call.
+    """
+
+    __slots__ = (
+        'counts', 'fallbacks', 'sample_every', 'countdown', 'buckets',
+        'latency_count', 'latency_sum', 'latency_max', 'timer')
+
+    # -------------------------------------------------------------------------
+    def __init__(self, sample_every):
+
+        import time
+
+        self.counts = {}
+        for path in _STATS_PATHS:
+            for outcome in _STATS_OUTCOMES:
+                self.counts[(path, outcome)] = 0
+        self.fallbacks = 0
+        self.sample_every = sample_every
+        self.countdown = sample_every
+        self.buckets = [0] * (len(_STATS_BUCKETS) + 1)
+        self.latency_count = 0
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+        self.timer = time.perf_counter
+
+    # -------------------------------------------------------------------------
+    def country(self, reg, lookup, key, flags, resolve_historic):
+
+        sampled = False
+        if self.sample_every:
+            self.countdown -= 1
+            if self.countdown <= 0:
+                self.countdown = self.sample_every
+                sampled = True
+                start = self.timer()
+
+        try:
+            index = lookup.get(key)
+        except (TypeError, ValueError):
+            key = _hashable_key(key)
+            index = lookup.get(key)
+        if index is None:
+            self.fallbacks += 1
+            index = _probe(reg, lookup, key)
+
+        result = None
+        if index is not None:
+            outcome = 'hit'
+            c = result = reg.countries[index]
+            if resolve_historic and c.flag == CNT_F_OLD:
+                succ = _get_successor_index(reg)[0][index]
+                result = succ[0] if len(succ) == 1 else succ
+        elif _find_index(reg, key) is not None:
+            outcome = 'filtered'
+        else:
+            outcome = 'miss'
+
+        if sampled:
+            self.add_latency(self.timer() - start)
+
+        self.counts[(_key_path(key), outcome)] += 1
+        return result
+
+    # -------------------------------------------------------------------------
+    def add_latency(self, seconds):
+
+        i = 0
+        for bound in _STATS_BUCKETS:
+            if seconds <= bound:
+                break
+            i += 1
+        self.buckets[i] += 1
+        self.latency_count += 1
+        self.latency_sum += seconds
+        if seconds > self.latency_max:
+            self.latency_max = seconds
+
+
+# =============================================================================
+def _key_path(key):
+    """
+    Returns the kind of the given key for the statistics: 'numeric',
+    'alpha2', 'alpha3' or 'other'.
+    """
+
+    if isinstance(key, int):
+        return 'numeric'
+    if isinstance(key, (bytes, bytearray, memoryview)):
+        key = bytes(key).decode('ascii', 'replace')
+    if isinstance(key, str):
+        if key.isalpha():
+            n = len(key)
+            return 'alpha2' if n == 2 else 'alpha3' if n == 3 else 'other'
+        str_key = key.strip()
+        if _is_numeric(str_key):
+            return 'numeric'
+        if len(str_key) == 2:
+            return 'alpha2'
+        if len(str_key) == 3:
+            return 'alpha3'
+    return 'other'
+
+
+# =============================================================================
+def enable_stats(sample_every=64):
+    """
+    Enables the counting of country() calls by the kind of the key and
+    the outcome and resets all counters. The latency is measured for every
+    sample_every-th call, 0 disables the latency sampling.
+    """
+
+    global _stats, _stats_enabled
+
+    sample_every = int(sample_every)
+    if sample_every < 0:
+        raise ValueError("Invalid sample rate %r." % (sample_every))
+
+    _stats = _LookupStats(sample_every)
+    _stats_enabled = True
+
+
+# =============================================================================
+def disable_stats():
+    """Disables the counting, the counters are kept for stats()."""
+
+    global _stats_enabled
+
+    _stats_enabled = False
+
+
+# =============================================================================
+def stats():
+    """
+    Returns the statistics of country() as a dict with the counts of all
+    lookups by kind of key and outcome, the number of keys which were not
+    found directly in the lookup table, the sampled latencies and the
+    statistics of the key cache.
+    """
+
+    info = cache_info()
+    result = {
+        'enabled': _stats_enabled,
+        'lookups': {},
+        'fallbacks': 0,
+        'latency': None,
+        'cache': {
+            'hits': info.hits, 'misses': info.misses,
+            'maxsize': info.maxsize, 'currsize': info.currsize},
+    }
+
+    st = _stats
+    if st is None:
+        return result
+
+    for (path, outcome), count in st.counts.items():
+        result['lookups'].setdefault(path, {})[outcome] = count
+    result['fallbacks'] = st.fallbacks
+    if st.sample_every:
+        buckets = []
+        cumulative = 0
+        for bound, count in zip(_STATS_BUCKETS + (None,), st.buckets):
+            cumulative += count
+            buckets.append((bound, cumulative))
+        result['latency'] = {
+            'sample_every': st.sample_every,
+            'count': st.latency_count,
+            'sum': st.latency_sum,
+            'max': st.latency_max,
+            'buckets': buckets,
+        }
+
+    return result
+
+
+# =============================================================================
+def stats_prometheus(prefix='geo_countries'):
+    """
+    Returns the statistics of stats() in the text exposition format
+    of Prometheus.
+    """
+
+    data = stats()
+    lines = []
+
+    name = '%s_lookups_total' % (prefix)
+    lines.append('# HELP %s Lookups with country() by kind of key and outcome.' % (name))
+    lines.append('# TYPE %s counter' % (name))
+    for path in _STATS_PATHS:
+        for outcome in _STATS_OUTCOMES:
+            count = data['lookups'].get(path, {}).get(outcome, 0)
+            lines.append('%s{path="%s",outcome="%s"} %d' % (name, path, outcome, count))
+
+    name = '%s_lookup_fallbacks_total' % (prefix)
+    lines.append('# HELP %s Keys not found directly in the lookup table.' % (name))
+    lines.append('# TYPE %s counter' % (name))
+    lines.append('%s %d' % (name, data['fallbacks']))
+
+    latency = data['latency']
+    if latency is not None:
+        name = '%s_lookup_seconds' % (prefix)
+        lines.append('# HELP %s Latency of country(), sampled every %d calls.' % (
+            name, latency['sample_every']))
+        lines.append('# TYPE %s histogram' % (name))
+        for bound, count in latency['buckets']:
+            le = '+Inf' if bound is None else repr(bound)
+            lines.append('%s_bucket{le="%s"} %d' % (name, le, count))
+        lines.append('%s_sum %r' % (name, latency['sum']))
+        lines.append('%s_count %d' % (name, latency['count']))
+
+    cache = data['cache']
+    for field, kind, text in (
+            ('hits', 'counter', 'Hits of the cache of raw keys.'),
+            ('misses', 'counter', 'Misses of the cache of raw keys.'),
+            ('currsize', 'gauge', 'Current size of the cache of raw keys.')):
+        name = '%s_cache_%s' % (prefix, field)
+        if kind == 'counter':
+            name += '_total'
+        lines.append('# HELP %s %s' % (name, text))
+        lines.append('# TYPE %s %s' % (name, kind))
+        lines.append('%s %d' % (name, cache[field]))
+
+    return '\n'.join(lines) + '\n'
+
+
+# =============================================================================
+def _get_numeric_array(reg, np, flags):
+    """
+    Returns the NumPy array for the vectorized lookup of numeric codes:
+    the mapping of all numeric codes 0..999 to the index in the countries
+    of reg matching flags (-1 for unknown codes).
+    """
+
+    indexes = reg._numeric_arrays.get(flags)
+    if indexes is None:
+        indexes = np.full(_NUMCODE_SLOTS, -1, dtype=np.intp)
+        for numcode in range(_NUMCODE_SLOTS):
+            index = _get_lookup(reg, flags).get(numcode)
+            if index is not None:
+                indexes[numcode] = index
+        reg._numeric_arrays[flags] = indexes
+
+    return indexes
+
+
+# =============================================================================
+def _countries_numpy(reg, np, keys, flags):
+
+    indexes = _get_numeric_array(reg, np, flags)
+
+    result = np.full(keys.shape, -1, dtype=np.intp)
+    valid = (keys >= 0) & (keys < _NUMCODE_SLOTS)
+    result[valid] = indexes[keys[valid]]
+
+    return result
+
+
+# =============================================================================
+def countries(keys, flags=CNT_F_ANY, as_index=False):
+    """
+    Resolves a whole sequence of keys at once.
+
+    The keys may be given as an iterable or as a NumPy array of integers,
+    numeric strings, 2-letter and 3-letter codes in the same manner like
+    for country(). The result is a list aligned to the keys containing
+    the found Country objects (or None for unknown keys). If as_index is
+    True, the indexes of the countries in the registry are returned
+    instead, with -1 for unknown keys.
+
+    Integer NumPy arrays are resolved in a vectorized manner, for them
+    a NumPy array of indexes is returned, if as_index is True.
+    """
+
+    _check_flags(flags)
+    reg = _registry
+    if reg is None:
+        reg = _build_registry()
+    return _countries(reg, keys, flags, as_index)
+
+
+# =============================================================================
+def all_countries(flags=CNT_F_ANY):
+    """
+    Returns the tuple of all countries matching flags in the order of
+    the registry, e.g. all_countries(CNT_F_REGION) for all M49 regions.
+    The tuple is built once per flags and shared by all callers.
+    """
+
+    reg = _registry
+    if reg is None:
+        reg = _build_registry()
+
+    result = reg._flag_countries.get(flags)
+    if result is None:
+        _check_flags(flags)
+        result = tuple(c for c in reg.countries if flags & c.flag)
+        reg._flag_countries[flags] = result
+    return result
+
+
+# =============================================================================
+def iter_countries(flags=CNT_F_ANY):
+    """Returns an iterator over all countries matching flags."""
+
+    return iter(all_countries(flags))
+
+
+# =============================================================================
+def _countries(reg, keys, flags, as_index):
+
+    cnt = reg.countries
+    np = sys.modules.get('numpy')
+    if np is not None and isinstance(keys, np.ndarray):
+        if keys.dtype.kind in 'iu':
+            result = _countries_numpy(reg, np, keys, flags)
+            if as_index:
+                return result
+            return [cnt[i] if i >= 0 else None for i in result.ravel().tolist()]
+        keys = keys.ravel().tolist()
+
+    lookup = _get_lookup(reg, flags)
+    get_index = lookup.get
+    probe = _probe
+    result = []
+    append = result.append
+    for key in keys:
+        try:
+            index = get_index(key)
+        except (TypeError, ValueError):
+            index = None
+        if index is None:
+            index = probe(reg, lookup, key)
+        if as_index:
+            append(-1 if index is None else index)
+        else:
+            append(None if index is None else cnt[index])
+
+    return result
+
+
+# =============================================================================
+def _is_null(key):
+    """
+    Returns, whether the key is a missing value, which is reported under
+    None: NaN, NaT or pandas.NA (which cannot be compared at all).
+    """
+
+    try:
+        return bool(key != key)
+    except TypeError:
+        return True
+
+
+# =============================================================================
+class Validator(object):
+    """
+    Validates a column of country keys given in chunks.
+
+    Every distinct value is resolved only once and remembered, the result
+    of a chunk is broadcast from the remembered results. So the memory
+    is bounded by the number of distinct values and not by the number of
+    rows. The invalid values are reported with the number of their
+    occurrences and their first position over all chunks, all NaN values
+    and None together under the key None.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(self, flags=CNT_F_ANY, to=None):
+
+        _check_flags(flags)
+        reg = _registry
+        if reg is None:
+            reg = _build_registry()
+
+        self.flags = flags
+        self.rows = 0
+        self.invalid = {}
+        self._reg = reg
+        self._memo = {}
+        # the index -1 of invalid values takes the trailing None
+        if to is None:
+            self._values = list(reg.countries) + [None]
+        else:
+            attr = field_attribute(to)
+            self._values = [getattr(c, attr) for c in reg.countries] + [None]
+
+    # -------------------------------------------------------------------------
+    def _resolve(self, key):
+
+        try:
+            index = _find_index(self._reg, key, self.flags)
+        except (TypeError, ValueError, OverflowError):
+            # e.g. None or an infinite float
+            index = None
+        return -1 if index is None else index
+
+    # -------------------------------------------------------------------------
+    def _report(self, chunk, indexes, invalid):
+
+        report = self.invalid
+        offset = self.rows
+        if len(invalid) <= 8:
+            for key in invalid:
+                count = chunk.count(key)
+                if key in report:
+                    report[key] = InvalidValue(report[key][0] + count, report[key][1])
+                else:
+                    report[key] = InvalidValue(count, offset + chunk.index(key))
+            return
+
+        for pos, index in enumerate(indexes):
+            if index < 0:
+                key = chunk[pos]
+                if key in report:
+                    report[key] = InvalidValue(report[key][0] + 1, report[key][1])
+                else:
+                    report[key] = InvalidValue(1, offset + pos)
+
+    # -------------------------------------------------------------------------
+    def feed(self, chunk):
+        """
+        Validates the next chunk of keys and returns the list of the
+        results aligned to the chunk (Country objects or the values of the
+        field 'to', None for invalid keys).
+        """
+
+        return list(map(self._values.__getitem__, self._feed(chunk)))
+
+    # -------------------------------------------------------------------------
+    def _feed(self, chunk):
+
+        chunk = list(chunk)
+        memo = self._memo
+        try:
+            distinct = set(chunk)
+        except TypeError:
+            chunk = [bytes(k) if isinstance(k, (bytearray, memoryview)) else k
+                     for k in chunk]
+            distinct = set(chunk)
+
+        # every NaN is a distinct key of its own, so all are merged into None
+        if any(map(_is_null, distinct)):
+            chunk = [None if _is_null(key) else key for key in chunk]
+            distinct = set(chunk)
+
+        for key in distinct.difference(memo):
+            memo[key] = self._resolve(key)
+
+        indexes = list(map(memo.__getitem__, chunk))
+        invalid = [key for key in distinct if memo[key] < 0]
+        if invalid:
+            self._report(chunk, indexes, invalid)
+        self.rows += len(chunk)
+
+        return indexes
+
+
+# =============================================================================
+def validate(keys, flags=CNT_F_ANY, to=None, chunk_size=65536):
+    """
+    Validates a whole column of country keys by resolving every distinct
+    value only once, e.g. for data quality checks of huge columns with
+    few distinct values. The keys are processed in chunks of chunk_size
+    by a Validator.
+
+    Returns a tuple of the list of results aligned to the keys (Country
+    objects or the values of the field 'to', None for invalid keys) and
+    a dict of every invalid value to its InvalidValue (the number of its
+    occurrences and its first position).
+
+    NumPy arrays give a NumPy object array of the results, numeric and
+    string arrays are reduced with numpy.unique() instead.
+    """
+
+    from itertools import islice
+
+    validator = Validator(flags, to)
+
+    np = sys.modules.get('numpy')
+    if np is not None and isinstance(keys, np.ndarray):
+        keys = keys.ravel()
+        if keys.dtype.kind in 'iufUS':
+            return _validate_numpy(np, validator, keys)
+        # numpy.unique() cannot sort mixed objects, e.g. strings and None
+        indexes = []
+        for start in range(0, len(keys), chunk_size):
+            indexes.extend(validator._feed(keys[start:start + chunk_size].tolist()))
+        values = np.array(validator._values, dtype=object)
+        return values[np.array(indexes, dtype=np.intp)], validator.invalid
+
+    result = []
+    iterator = iter(keys)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            break
+        result.extend(validator.feed(chunk))
+
+    return result, validator.invalid
+
+
+# =============================================================================
+def _validate_numpy(np, validator, keys):
+
+    uniques, first, inverse, counts = np.unique(
+        keys, return_index=True, return_inverse=True, return_counts=True)
+
+    indexes = np.array(
+        [validator._resolve(key) for key in uniques.tolist()], dtype=np.intp)
+    report = validator.invalid
+    for pos in np.flatnonzero(indexes < 0).tolist():
+        key = uniques[pos].item()
+        if _is_null(key):
+            key = None
+        if key in report:
+            count, position = report[key]
+            report[key] = InvalidValue(
+                count + int(counts[pos]), min(position, int(first[pos])))
+        else:
+            report[key] = InvalidValue(int(counts[pos]), int(first[pos]))
+    validator.rows = len(keys)
+
+    values = np.array(validator._values, dtype=object)
+    return values[indexes[inverse.ravel()]], report
+
+
+# =============================================================================
+def scan_codes(buffer, offsets, width, flags=CNT_F_ANY, as_index=False):
+    """
+    Resolves the fixed-width codes of width bytes at the given offsets of
+    a byte buffer (bytes, bytearray, mmap, memoryview ...), e.g. a field
+    of fixed-width records with offsets=range(start, len(buffer), size).
+    The result is like of countries() for these codes, all offsets must
+    lie within the buffer.
+
+    Every code is taken as a small bytes object and looked up in the byte
+    keys of the lookup table without decoding. Copying these few bytes is
+    cheaper than hashing and comparing memoryview slices.
+    """
+
+    _check_flags(flags)
+    reg = _registry
+    if reg is None:
+        reg = _build_registry()
+
+    mmap = sys.modules.get('mmap')
+    if isinstance(buffer, bytes) or (mmap is not None and isinstance(buffer, mmap.mmap)):
+        keys = (buffer[pos:pos + width] for pos in offsets)
+    else:
+        view = memoryview(buffer)
+        if view.format != 'B' or view.ndim != 1:
+            view = view.cast('B')
+        keys = (view[pos:pos + width].tobytes() for pos in offsets)
+
+    return _countries(reg, keys, flags, as_index)
+
+
+# =============================================================================
+def field_attribute(field):
+    """
+    Returns the name of the attribute of a Country object for the given
+    field (one of the CNT_I_* constants), e.g. 'three_letter' for
+    CNT_I_CODE3.
+    """
+
+    if field.__class__ is not int or not 0 <= field < len(_FIELD_ATTRIBUTES):
+        raise ValueError("Invalid country field %r." % (field))
+    return _FIELD_ATTRIBUTES[field]
+
+
+# =============================================================================
+def _get_convert_tables(reg, to, flags):
+    """
+    Returns the precomputed tables of reg for convert() into the field
+    'to' of the countries matching flags: a dense list of the target values
+    for all numeric codes 0..999, a dict of the target values for all keys
+    of the lookup table of flags (also None, if a country has no target
+    value) and the list of the target values of all countries.
+    """
+
+    attr = field_attribute(to)
+    lookup = _get_lookup(reg, flags)
+
+    tables = reg._convert_tables.get((to, flags))
+    if tables is None:
+        values = [getattr(c, attr) for c in reg.countries]
+
+        dense = [None] * _NUMCODE_SLOTS
+        for numcode in range(_NUMCODE_SLOTS):
+            index = lookup.get(numcode)
+            if index is not None:
+                dense[numcode] = values[index]
+
+        by_key = {key: values[index] for key, index in lookup.items()}
+
+        tables = (dense, by_key, values)
+        reg._convert_tables[(to, flags)] = tables
+
+    return tables
+
+
+# =============================================================================
+def convert(key, to=CNT_I_CODE3, flags=CNT_F_ANY):
+    """
+    Converts the given key (like for country()) directly into the field
+    'to' (one of the CNT_I_* indexes) of the found country, e.g. 'DE'
+    into 'DEU'. Returns None, if the key could not be found or the
+    country has no such code.
+
+    Integers between 0 and 999 are converted by indexing a dense list,
+    all other keys by a single dict probe in a precomputed table.
+    """
+
+    reg = _registry
+    if reg is None:
+        reg = _build_registry()
+
+    tables = reg._convert_tables.get((to, flags))
+    if tables is None:
+        tables = _get_convert_tables(reg, to, flags)
+
+    if key.__class__ is int and 0 <= key < _NUMCODE_SLOTS:
+        return tables[0][key]
+
+    try:
+        value = tables[1].get(key, _MISSING)
+    except (TypeError, ValueError):
+        value = _MISSING
+    if value is _MISSING:
+        value = _probe(reg, tables[1], key)
+    return value
+
+
+# =============================================================================
+def convert_all(keys, to=CNT_I_CODE3, flags=CNT_F_ANY):
+    """
+    Converts a whole sequence of keys into the field 'to' and returns
+    a list of the results aligned to the keys (None for unknown keys).
+
+    Integer NumPy arrays are converted in a vectorized manner into
+    a NumPy object array.
+    """
+
+    reg = _registry
+    if reg is None:
+        reg = _build_registry()
+    dense, by_key, values = _get_convert_tables(reg, to, flags)
+
+    np = sys.modules.get('numpy')
+    if np is not None and isinstance(keys, np.ndarray):
+        if keys.dtype.kind in 'iu':
+            indexes = _countries_numpy(reg, np, keys, flags)
+            # the index -1 of unknown keys takes the trailing None
+            return np.array(values + [None], dtype=object)[indexes]
+        keys = keys.ravel().tolist()
+
+    get_value = by_key.get
+    probe = _probe
+    missing = _MISSING
+    slots = _NUMCODE_SLOTS
+    result = []
+    append = result.append
+    for key in keys:
+        if key.__class__ is int and 0 <= key < slots:
+            append(dense[key])
+            continue
+        try:
+            value = get_value(key, missing)
+        except (TypeError, ValueError):
+            value = missing
+        if value is missing:
+            value = probe(reg, by_key, key)
+        append(value)
+
+    return result
+
+
+# =============================================================================
+def _normalize_name(name):
+    """
+    Normalizes a country name for comparison: casefolded, without accents
+    and with all punctuation replaced by single spaces, e.g.
+    "Côte d'Ivoire" -> 'cote d ivoire'.
+    """
+
+    import unicodedata
+
+    name = unicodedata.normalize('NFKD', name)
+    chars = []
+    for char in name:
+        if unicodedata.combining(char):
+            continue
+        chars.append(char if char.isalnum() else ' ')
+    return ' '.join(''.join(chars).casefold().split())
+
+
+# =============================================================================
+def _trigrams(normalized):
+    """
+    Returns the set of trigrams of a normalized name, every word padded
+    with two leading and one trailing blank.
+    """
+
+    result = set()
+    for word in normalized.split():
+        word = '  ' + word + ' '
+        for i in range(len(word) - 2):
+            result.add(word[i:i + 3])
+    return result
+
+
+# =============================================================================
+def _get_name_index(reg):
+    """
+    Returns the trigram index over the normalized names of all countries
+    of reg: a dict of every trigram to the tuple of the indexes of the
+    countries containing it and a list of the number of trigrams of every
+    country.
+    """
+
+    index = reg._name_index
+    if index is None:
+        postings = {}
+        sizes = []
+        for i, c in enumerate(reg.countries):
+            grams = _trigrams(_normalize_name(c.name))
+            sizes.append(len(grams))
+            for gram in grams:
+                postings.setdefault(gram, []).append(i)
+        postings = {gram: tuple(idx) for gram, idx in postings.items()}
+        index = (postings, sizes)
+        reg._name_index = index
+
+    return index
+
+
+# =============================================================================
+def search_name(query, limit=5, flags=CNT_F_ANY):
+    """
+    Searches countries by a possibly misspelled or incomplete name,
+    e.g. 'Viet nam', 'Cote d Ivoire' or 'Tanzania'.
+
+    Returns a list of at most limit tuples of the found Country object
+    and its score between 0 and 1, best matches first. The score is the
+    mean of the trigram similarity of the normalized names (Dice
+    coefficient) and the share of the trigrams of the query found in
+    the name, so long official names like 'Iran (Islamic Republic of)'
+    are not penalized.
+    """
+
+    _check_flags(flags)
+    reg = _registry
+    if reg is None:
+        reg = _build_registry()
+    postings, sizes = _get_name_index(reg)
+
+    grams = _trigrams(_normalize_name(str(query)))
+    if not grams or limit < 1:
+        return []
+
+    common = {}
+    for gram in grams:
+        for i in postings.get(gram, ()):
+            common[i] = common.get(i, 0) + 1
+
+    cnt = reg.countries
+    qsize = len(grams)
+    scored = []
+    for i, count in common.items():
+        c = cnt[i]
+        if flags & c.flag:
+            dice = 2.0 * count / (qsize + sizes[i])
+            scored.append(((dice + float(count) / qsize) / 2, c.name, c))
+
+    scored.sort(key=lambda item: (-item[0], item[1]))
+    return [(c, score) for score, name, c in scored[:limit]]
+
+
+# =============================================================================
+def _name_variants(name):
+    """
+    Generates the alternative normalized forms of a country name: without
+    a parenthesized part, e.g. 'iran' for 'Iran (Islamic Republic of)',
+    and with an inverted order around a comma, e.g. 'federated states of
+    micronesia' for 'Micronesia, Federated States of'.
+    """
+
+    import re
+
+    if '(' in name:
+        yield _normalize_name(re.sub(r'\([^)]*\)', ' ', name))
+    if ',' in name:
+        head, tail = name.split(',', 1)
+        yield _normalize_name(tail + ' ' + head)
+
+
+# =============================================================================
+def _get_name_lookup(reg, flags):
+    """
+    Returns the exact name lookup table for the countries of reg matching
+    flags: a dict of the names to the indexes of the countries.
+
+    The keys are the names as they are, casefolded and normalized by
+    _normalize_name(), followed by the unambiguous variants of
+    _name_variants() and finally the aliases of _name_aliases. For
+    duplicate keys the first country is kept.
+    """
+
+    _check_flags(flags)
+
+    name_lookup = reg._name_lookups.get(flags)
+    if name_lookup is None:
+        lookup = _get_lookup(reg, flags)
+        name_lookup = {}
+        variants = {}
+        for i, c in enumerate(reg.countries):
+            if not flags & c.flag:
+                continue
+            name_lookup.setdefault(_normalize_name(c.name), i)
+            name_lookup.setdefault(c.name.casefold(), i)
+            name_lookup.setdefault(c.name, i)
+            for variant in _name_variants(c.name):
+                variants.setdefault(variant, set()).add(i)
+
+        for variant, indexes in variants.items():
+            if len(indexes) == 1:
+                name_lookup.setdefault(variant, indexes.pop())
+
+        for alias, key in _name_aliases:
+            i = lookup.get(key)
+            if i is not None:
+                name_lookup.setdefault(_normalize_name(alias), i)
+
+        reg._name_lookups[flags] = name_lookup
+
+    return name_lookup
+
+
+# =============================================================================
+def country_by_name(name, flags=CNT_F_ANY):
+    """
+    Returns the Country with exactly the given name or a common alias of it
+    (e.g. 'Ivory Coast', 'Russia' or 'North Korea'), case, accent and
+    punctuation insensitive, or None. In contrast to search_name() there
+    is no guessing of misspelled names.
+
+    Names of historic countries (e.g. 'Burma') are found with their
+    CNT_F_OLD rows, with CNT_F_REGULAR the alias to the current country
+    is found instead.
+    """
+
+    reg = _registry
+    if reg is None:
+        reg = _build_registry()
+    name_lookup = reg._name_lookups.get(flags)
+    if name_lookup is None:
+        name_lookup = _get_name_lookup(reg, flags)
+
+    name = str(name)
+    index = name_lookup.get(name)
+    if index is None:
+        index = name_lookup.get(name.casefold())
+        if index is None:
+            index = name_lookup.get(_normalize_name(name))
+            if index is None:
+                return None
+    return reg.countries[index]
+
+
+# =============================================================================
+def _sorted_pairs(entries):
+
+    entries = sorted(entries)
+    return ([e[0] for e in entries], [e[1] for e in entries])
+
+
+# =============================================================================
+def _get_prefix_index(reg, flags):
+    """
+    Returns the prefix index for the countries of reg matching flags: a dict of
+    the lower case codes to the index of the country and the sorted lists
+    of normalized names, lower case codes and name endings starting at an
+    inner word, each with a parallel list of the indexes of the countries.
+    """
+
+    _check_flags(flags)
+
+    prefix_index = reg._prefix_indexes.get(flags)
+    if prefix_index is None:
+        exact = {}
+        names = set()
+        codes = set()
+        words = set()
+        for i, c in enumerate(reg.countries):
+            if not flags & c.flag:
+                continue
+            for code in (c.two_letter, c.three_letter):
+                if code:
+                    exact.setdefault(code.lower(), i)
+                    codes.add((code.lower(), i))
+            parts = _normalize_name(c.name).split()
+            names.add((' '.join(parts), i))
+            for start in range(1, len(parts)):
+                words.add((' '.join(parts[start:]), i))
+        prefix_index = (exact, (
+            _sorted_pairs(names), _sorted_pairs(codes), _sorted_pairs(words)))
+        reg._prefix_indexes[flags] = prefix_index
+
+    return prefix_index
+
+
+# =============================================================================
+def prefix_search(prefix, limit=10, flags=CNT_F_ANY):
+    """
+    Returns a list of at most limit countries, whose code, name or a word
+    of the name starts with the given prefix (case and accent insensitive),
+    e.g. for typeahead.
+
+    A country with exactly this code comes first, followed by countries
+    whose name starts with the prefix, whose code starts with it and
+    finally whose name contains a word starting with it, each in
+    alphabetical order. Every part bisects a sorted index, which is built
+    once per flags.
+    """
+
+    from bisect import bisect_left
+
+    reg = _registry
+    if reg is None:
+        reg = _build_registry()
+    exact, sorted_indexes = _get_prefix_index(reg, flags)
+
+    prefix = _normalize_name(str(prefix))
+    if not prefix or limit < 1:
+        return []
+
+    cnt = reg.countries
+    seen = set()
+    result = []
+
+    i = exact.get(prefix)
+    if i is not None:
+        seen.add(i)
+        result.append(cnt[i])
+
+    for keys, indexes in sorted_indexes:
+        pos = bisect_left(keys, prefix)
+        size = len(keys)
+        while len(result) < limit and pos < size and keys[pos].startswith(prefix):
+            i = indexes[pos]
+            if i not in seen:
+                seen.add(i)
+                result.append(cnt[i])
+            pos += 1
+
+    return result[:limit]
+
+
+# =============================================================================
+def _get_region_index(reg):
+    """
+    Returns the precomputed index of the M49 region tree built from
+    _m49_tree, a tuple of three dicts with indexes of the countries of reg:
+    every region to the tuple of its direct sub-regions, every region
+    to the frozenset of all countries contained directly or in its
+    sub-regions, and every country or region to the tuple of all regions
+    containing it (nearest first).
+
+    Codes of _m49_tree missing in the registry are ignored.
+    """
+
+    region_index = reg._region_index
+    if region_index is None:
+        cnt = reg.countries
+        numeric = reg.numeric
+        children = {}
+        parent = {}
+        for region_code, child_codes in _m49_tree:
+            region = numeric.get(region_code)
+            if region is None or not cnt[region].flag & CNT_F_REGION:
+                continue
+            children[region] = [
+                numeric[code] for code in child_codes if code in numeric]
+            for child in children[region]:
+                parent.setdefault(child, region)
+
+        ancestors = {}
+        for child in parent:
+            chain = []
+            region = parent.get(child)
+            while region is not None and region not in chain:
+                chain.append(region)
+                region = parent.get(region)
+            ancestors[child] = tuple(chain)
+
+        members = dict((region, set()) for region in children)
+        for child, chain in ancestors.items():
+            if child in children:
+                continue
+            for region in chain:
+                members[region].add(child)
+
+        subregions = dict(
+            (region, tuple(c for c in kids if c in children))
+            for region, kids in children.items())
+        members = dict(
+            (region, frozenset(idx)) for region, idx in members.items())
+        region_index = (subregions, members, ancestors)
+        reg._region_index = region_index
+
+    return region_index
+
+
+# =============================================================================
+def _region_key(reg, region):
+
+    return _find_index(reg, region, CNT_F_REGION)
+
+
+# =============================================================================
+def countries_in_region(region):
+    """
+    Returns the frozenset of all countries of the given M49 region (a key
+    like for country(), e.g. 150 for Europe), also of its sub-regions.
+    Returns None, if region is not a known region.
+    """
+
+    reg = _registry
+    if reg is None:
+        reg = _build_registry()
+    index = _region_key(reg, region)
+    if index is None:
+        return None
+
+    members = _get_region_index(reg)[1]
+    result = reg._region_sets.get(index)
+    if result is None:
+        cnt = reg.countries
+        result = frozenset(cnt[i] for i in members.get(index, ()))
+        reg._region_sets[index] = result
+    return result
+
+
+# =============================================================================
+def subregions(region):
+    """
+    Returns the tuple of the direct sub-regions of the given M49 region.
+    Returns None, if region is not a known region.
+    """
+
+    reg = _registry
+    if reg is None:
+        reg = _build_registry()
+    index = _region_key(reg, region)
+    if index is None:
+        return None
+
+    cnt = reg.countries
+    return tuple(cnt[i] for i in _get_region_index(reg)[0].get(index, ()))
+
+
+# =============================================================================
+def regions_of(key, flags=CNT_F_ANY):
+    """
+    Returns the tuple of all M49 regions containing the country (or region)
+    found for key, the nearest region first, e.g. (Western Europe, Europe)
+    for 'DE'. Returns None, if the key could not be found.
+    """
+
+    _check_flags(flags)
+    reg = _registry
+    if reg is None:
+        reg = _build_registry()
+
+    cnt = reg.countries
+    index = _find_index(reg, key, flags)
+    if index is None:
+        return None
+
+    return tuple(cnt[i] for i in _get_region_index(reg)[2].get(index, ()))
+
+
+# =============================================================================
+def _get_region_map(reg, regions):
+    """
+    Returns a list mapping every index of the countries of reg to the
+    numeric code of the first of the given regions containing it (or None).
+    """
+
+    region_map = reg._region_maps.get(regions)
+    if region_map is None:
+        members = _get_region_index(reg)[1]
+        region_map = [None] * len(reg.countries)
+        for code in reversed(regions):
+            index = _region_key(reg, code)
+            if index is None:
+                raise ValueError("Invalid region %r." % (code))
+            numcode = reg.countries[index].numcode
+            region_map[index] = numcode
+            for i in members.get(index, ()):
+                region_map[i] = numcode
+        reg._region_maps[regions] = region_map
+
+    return region_map
+
+
+# =============================================================================
+def region_of_all(keys, regions=_M49_CONTINENTS, flags=CNT_F_ANY):
+    """
+    Returns for every key the numeric code of the first of the given
+    regions (by default the continents) containing its country, e.g. for
+    aggregations by region. The result is a list aligned to the keys,
+    with None for unknown keys or countries outside of all regions.
+
+    Integer NumPy arrays are mapped in a vectorized manner into a NumPy
+    array of region codes with -1 instead of None.
+    """
+
+    _check_flags(flags)
+    reg = _registry
+    if reg is None:
+        reg = _build_registry()
+    regions = tuple(regions)
+    region_map = _get_region_map(reg, regions)
+
+    np = sys.modules.get('numpy')
+    if np is not None and isinstance(keys, np.ndarray) and keys.dtype.kind in 'iu':
+        indexes = _countries_numpy(reg, np, keys, flags)
+        codes = np.array(
+            [-1 if code is None else code for code in region_map] + [-1],
+            dtype=np.intp)
+        # the index -1 of unknown keys takes the trailing -1
+        return codes[indexes]
+
+    return [None if i < 0 else region_map[i]
+            for i in _countries(reg, keys, flags, True)]
+
+
+# =============================================================================
+def _get_successor_index(reg):
+    """
+    Returns two lists aligned to the countries of reg: the tuples of the current
+    successor countries of every historic country (by _historic_successors),
+    the tuple of the country itself for all others and for historic
+    countries without a known successor, and the tuples of the historic
+    predecessors of every current country.
+    """
+
+    successor_index = reg._successor_index
+    if successor_index is None:
+        cnt = reg.countries
+        current = {}
+        for c in cnt:
+            if c.numcode is not None and c.flag != CNT_F_OLD:
+                current.setdefault(c.numcode, c)
+
+        successors = dict(_historic_successors)
+        succ = []
+        pred = dict((id(c), []) for c in cnt)
+        for c in cnt:
+            result = (c, )
+            if c.flag == CNT_F_OLD and c.numcode in successors:
+                found = tuple(
+                    current[code] for code in successors[c.numcode]
+                    if code in current)
+                if found:
+                    result = found
+                    for new in found:
+                        pred[id(new)].append(c)
+            succ.append(result)
+        successor_index = (succ, [tuple(pred[id(c)]) for c in cnt])
+        reg._successor_index = successor_index
+
+    return successor_index
+
+
+# =============================================================================
+def successors(key, flags=CNT_F_ANY):
+    """
+    Returns the tuple of the current countries succeeding the historic
+    country found for key (a tuple with the country itself for a current
+    country), or None, if the key could not be found.
+    """
+
+    _check_flags(flags)
+    reg = _registry
+    if reg is None:
+        reg = _build_registry()
+
+    index = _find_index(reg, key, flags)
+    if index is None:
+        return None
+    return _get_successor_index(reg)[0][index]
+
+
+# =============================================================================
+def predecessors(key, flags=CNT_F_ANY):
+    """
+    Returns the tuple of the historic countries succeeded by the country
+    found for key, or None, if the key could not be found.
+    """
+
+    _check_flags(flags)
+    reg = _registry
+    if reg is None:
+        reg = _build_registry()
+
+    index = _find_index(reg, key, flags)
+    if index is None:
+        return None
+    return _get_successor_index(reg)[1][index]
+
+
+# =============================================================================
+def successors_all(keys, flags=CNT_F_ANY):
+    """
+    Resolves a whole sequence of keys to the tuples of their current
+    countries like successors(), e.g. for backfilling datasets with
+    historic codes. Returns a list aligned to the keys with None for
+    unknown keys.
+    """
+
+    _check_flags(flags)
+    reg = _registry
+    if reg is None:
+        reg = _build_registry()
+    successor_index = _get_successor_index(reg)[0]
+    return [None if i < 0 else successor_index[i]
+            for i in _countries(reg, keys, flags, True)]
+
+
+# =============================================================================
+_cdata = (
+    ('AF', 'AFG',   4, 'Afghanistan'),
+    ('AL', 'ALB',   8, 'Albania'),
+    ('DZ', 'DZA',  12, 'Algeria'),
+    ('AS', 'ASM',  16, 'American Samoa'),
+    ('AD', 'AND',  20, 'Andorra'),
+    ('AO', 'AGO',  24, 'Angola'),
+    ('AI', 'AIA', 660, 'Anguilla'),
+    ('AQ', None, None, 'Antarctica'),
+    ('AG', 'ATG',  28, 'Antigua and Barbuda'),
+    (None, None,  896, 'Areas not elsewhere specified'),
+    (None, None,  898, 'Areas not specified'),
+    ('AR', 'ARG',  32, 'Argentina'),
+    ('AM', 'ARM',  51, 'Armenia'),
+    ('AW', 'ABW', 533, 'Aruba'),
+    ('AU', 'AUS',  36, 'Australia'),
+    ('AT', 'AUT',  40, 'Austria'),
+    ('AZ', 'AZE',  31, 'Azerbaijan'),
+    ('BS', 'BHS',  44, 'Bahamas'),
+    ('BH', 'BHR',  48, 'Bahrain'),
+    ('BD', 'BGD',  50, 'Bangladesh'),
+    ('BB', 'BRB',  52, 'Barbados'),
+    ('BY', 'BLR', 112, 'Belarus'),
+    ('BE', 'BEL',  56, 'Belgium'),
+    ('BZ', 'BLZ',  84, 'Belize'),
+    ('BJ', 'BEN', 204, 'Benin'),
+    ('BM', 'BMU',  60, 'Bermuda'),
+    ('BT', 'BTN',  64, 'Bhutan'),
+    ('BO', 'BOL',  68, 'Bolivia'),
+    ('BA', 'BIH',  70, 'Bosnia and Herzegovina'),
+    ('BW', 'BWA',  72, 'Botswana'),
+    ('BV', None, None, 'Bouvet Island'),
+    ('BR', 'BRA',  76, 'Brazil'),
+    ('IO', None, None, 'British Indian Ocean Territory'),
+    ('VG', 'VGB',  92, 'British Virgin Islands'),
+    ('BN', 'BRN',  96, 'Brunei Darussalam'),
+    ('BG', 'BGR', 100, 'Bulgaria'),
+    ('BF', 'BFA', 854, 'Burkina Faso'),
+    ('BI', 'BDI', 108, 'Burundi'),
+    ('KH', 'KHM', 116, 'Cambodia'),
+    ('CM', 'CMR', 120, 'Cameroon'),
+    ('CA', 'CAN', 124, 'Canada'),
+    ('CV', 'CPV', 132, 'Cape Verde'),
+    ('KY', 'CYM', 136, 'Cayman Islands'),
+    ('CF', 'CAF', 140, 'Central African Republic'),
+    ('TD', 'TCD', 148, 'Chad'),
+    (None, None,  830, 'Channel Islands'),
+    ('CL', 'CHL', 152, 'Chile'),
+    ('CN', 'CHN', 156, 'China'),
+    ('CX', None, None, 'Christmas Island'),
+    ('CC', None, None, 'Cocos (keeling) Islands'),
+    ('CO', 'COL', 170, 'Colombia'),
+    ('KM', 'COM', 174, 'Comoros'),
+    ('CG', 'COG', 178, 'Congo'),
+    ('CK', 'COK', 184, 'Cook Islands'),
+    ('CR', 'CRI', 188, 'Costa Rica'),
+    ('CI', 'CIV', 384, 'Côte d\'Ivoire'),
+    ('HR', 'HRV', 191, 'Croatia'),
+    ('CU', 'CUB', 192, 'Cuba'),
+    ('CY', 'CYP', 196, 'Cyprus'),
+    ('CZ', 'CZE', 203, 'Czech Republic'),
+    ('KP', 'PRK', 408, 'Democratic People\'s Republic of Korea'),
+    ('CD', 'COD', 180, 'Democratic Republic of the Congo'),
+    ('DK', 'DNK', 208, 'Denmark'),
+    ('DJ', 'DJI', 262, 'Djibouti'),
+    ('DM', 'DMA', 212, 'Dominica'),
+    ('DO', 'DOM', 214, 'Dominican Republic'),
+    ('TP', 'TMP', 626, 'East Timor'),
+    ('EC', 'ECU', 218, 'Ecuador'),
+    ('EG', 'EGY', 818, 'Egypt'),
+    ('SV', 'SLV', 222, 'El Salvador'),
+    ('GQ', 'GNQ', 226, 'Equatorial Guinea'),
+    ('ER', 'ERI', 232, 'Eritrea'),
+    ('EE', 'EST', 233, 'Estonia'),
+    ('ET', 'ETH', 231, 'Ethiopia'),
+    ('FO', 'FRO', 234, 'Faeroe Islands'),
+    ('FK', 'FLK', 238, 'Falkland Islands (Malvinas)'),
+    ('FM', 'FSM', 583, 'Micronesia, Federated States of'),
+    ('FJ', 'FJI', 242, 'Fiji'),
+    ('FI', 'FIN', 246, 'Finland'),
+    ('MK', 'MKD', 807, 'The former Yugoslav Republic of Macedonia'),
+    ('FR', 'FRA', 250, 'France'),
+    ('GF', 'GUF', 254, 'French Guiana'),
+    ('PF', 'PYF', 258, 'French Polynesia'),
+    ('TF', None, None, 'French Southern Territories'),
+    ('GA', 'GAB', 266, 'Gabon'),
     ('GM', 'GMB', 270, 'Gambia'),
     ('GE', 'GEO', 268, 'Georgia'),
     ('DE', 'DEU', 276, 'Germany'),
@@ -424,43 +2198,1154 @@ _cdata = (
     (None, None,   61, 'Polynesia',                       CNT_F_REGION),
 )
 
-for data in _cdata:
-    flag = CNT_F_REGULAR
-    if len(data) > 4:
-        flag = data[4]
-    c = Country(data[3], data[0], data[1], data[2], flag)
-    _country.append(c)
-    index = len(_country) - 1
-
-    if c.two_letter:
-        key = c.two_letter.lower()
-        if key in _two_letter:
-            warnings.warn((
-                "Two letter code %r already exists." % (key)), RuntimeWarning)
-        else:
-            _two_letter[key] = index
+# UN M49 composition of the regions in _cdata (as of 2015): numeric code
+# of every region with the numeric codes of its sub-regions or countries
+_m49_tree = (
+    (2, (14, 17, 15, 18, 11)),
+    (14, (108, 174, 262, 232, 231, 404, 450, 454, 480, 175, 508, 638, 646,
+          690, 706, 800, 834, 894, 716)),
+    (17, (24, 120, 140, 148, 178, 180, 226, 266, 678)),
+    (15, (12, 818, 434, 504, 729, 736, 788, 732)),
+    (18, (72, 426, 516, 710, 748)),
+    (11, (204, 854, 132, 384, 270, 288, 324, 624, 430, 466, 478, 562, 566,
+          654, 686, 694, 768)),
+    (19, (419, 21)),
+    (419, (29, 13, 5)),
+    (29, (660, 28, 533, 44, 52, 92, 136, 192, 212, 214, 308, 312, 332, 388,
+          474, 500, 530, 630, 652, 659, 662, 663, 670, 780, 796, 850)),
+    (13, (84, 188, 222, 320, 340, 484, 558, 591)),
+    (5, (32, 68, 76, 152, 170, 218, 238, 254, 328, 600, 604, 740, 858, 862)),
+    (21, (60, 124, 304, 666, 840)),
+    (142, (30, 62, 35, 145)),
+    (30, (156, 344, 446, 408, 392, 496, 410)),
+    (62, (398, 417, 762, 795, 860, 4, 50, 64, 356, 364, 462, 524, 586, 144)),
+    (35, (96, 116, 360, 418, 458, 104, 608, 702, 764, 626, 704)),
+    (145, (51, 31, 48, 196, 268, 368, 376, 400, 414, 422, 275, 512, 634, 682,
+           760, 792, 784, 887)),
+    (150, (151, 154, 39, 155)),
+    (151, (112, 100, 203, 348, 616, 498, 642, 643, 703, 804)),
+    (154, (248, 830, 831, 832, 208, 233, 234, 246, 352, 372, 833, 428, 440,
+           578, 744, 752, 826)),
+    (39, (8, 20, 70, 191, 292, 300, 336, 380, 470, 499, 620, 674, 688, 705,
+          724, 807, 891)),
+    (155, (40, 56, 250, 276, 438, 442, 492, 528, 756)),
+    (9, (53, 54, 55)),
+    (53, (36, 554, 574)),
+    (54, (242, 540, 598, 90, 548)),
+    (55, (57, 61)),
+    (57, (316, 296, 584, 583, 520, 580, 585)),
+    (61, (16, 184, 258, 570, 612, 882, 772, 776, 798, 876)),
+)
+
+
+# Numeric codes of the current successors of historic countries (CNT_F_OLD)
+_historic_successors = (
+    (810, (643, 804, 112, 498, 233, 428, 440, 268, 51, 31, 398, 417, 762,
+           795, 860)),
+    (532, (531, 534, 535)),
+    (890, (705, 191, 70, 807, 891)),
+    (200, (203, 703)),
+    (278, (276, )),
+    (280, (276, )),
+    (582, (584, 583, 580, 585)),
+    (720, (887, )),
+    (886, (887, )),
+    (230, (231, 232)),
+    (104, (104, )),
+    (116, (116, )),
+    (180, (180, )),
+    (384, (384, )),
+    (854, (854, )),
+)
+
+
+# Common alternative names of countries with the key of the country
+_name_aliases = (
+    ('Ivory Coast', 'CIV'),
+    ('Burma', 'MMR'),
+    ('Zaire', 'COD'),
+    ('DR Congo', 'COD'),
+    ('Congo-Kinshasa', 'COD'),
+    ('Congo-Brazzaville', 'COG'),
+    ('Republic of the Congo', 'COG'),
+    ('North Korea', 'PRK'),
+    ('South Korea', 'KOR'),
+    ('Korea', 'KOR'),
+    ('Laos', 'LAO'),
+    ('Russia', 'RUS'),
+    ('Syria', 'SYR'),
+    ('Vietnam', 'VNM'),
+    ('Moldova', 'MDA'),
+    ('Tanzania', 'TZA'),
+    ('Macedonia', 'MKD'),
+    ('North Macedonia', 'MKD'),
+    ('Czechia', 'CZE'),
+    ('Libya', 'LBY'),
+    ('Brunei', 'BRN'),
+    ('Cabo Verde', 'CPV'),
+    ('Eswatini', 'SWZ'),
+    ('Timor-Leste', 'TMP'),
+    ('Micronesia', 'FSM'),
+    ('Vatican', 'VAT'),
+    ('Vatican City', 'VAT'),
+    ('Palestine', 'PSE'),
+    ('Taiwan', 'TWN'),
+    ('Great Britain', 'GBR'),
+    ('Britain', 'GBR'),
+    ('UK', 'GBR'),
+    ('United States of America', 'USA'),
+    ('UAE', 'ARE'),
+    ('Holland', 'NLD'),
+)
+
+
+# =============================================================================
+def _rows_of_cdata():
+    """Generates the rows of _cdata with a flag in the fifth field."""
+
+    for data in _cdata:
+        if len(data) > 4:
+            yield data
+        else:
+            yield tuple(data) + (CNT_F_REGULAR, )
+
+
+# =============================================================================
+def check_data(rows):
+    """
+    Checks the given rows of country data (2-letter code, 3-letter code,
+    numeric code, name, flag) for duplicate codes and emits a RuntimeWarning
+    for every duplicate. Returns the list of the warning messages.
+
+    The registry itself silently keeps the first country of every code,
+    so this check belongs to compiling a dataset, see compile_registry().
+    """
+
+    messages = []
+    seen = ({}, {}, {})
+    for data in rows:
+        for i, label in enumerate(('Two letter', 'Three letter', 'Numeric')):
+            key = data[i]
+            if key is None or key == '':
+                continue
+            if i < 2:
+                key = key.lower()
+            if key in seen[i]:
+                messages.append("%s code %r already exists." % (label, key))
+            else:
+                seen[i][key] = True
+
+    for message in messages:
+        warnings.warn(message, RuntimeWarning, stacklevel=2)
+    return messages
+
+
+# =============================================================================
+def _build_registry():
+    """
+    Builds the registry of all countries from _cdata, if not done before,
+    and returns the current Registry snapshot.
+
+    This is done once on first use instead of at import time, concurrent
+    callers are waiting for the first one.
+    """
+
+    global _registry
+
+    with _registry_lock:
+        reg = _registry
+        if reg is None:
+            reg = Registry(_rows_of_cdata())
+            _registry = reg
+
+    return reg
+
+
+# =============================================================================
+def registry():
+    """Returns the current Registry snapshot."""
+
+    reg = _registry
+    if reg is None:
+        reg = _build_registry()
+    return reg
+
+
+# =============================================================================
+# External datasets and the compiled binary cache
+
+_CACHE_MAGIC = b'GEOC'
+_CACHE_FORMAT = 2
+# magic, format version, marshal version, SHA-256 digest of the source,
+# followed by the marshalled rows and indexes
+_CACHE_HEADER = '<4sHH32s'
+_FLAG_NAMES = {'regular': CNT_F_REGULAR, 'old': CNT_F_OLD, 'region': CNT_F_REGION}
+
+
+# =============================================================================
+def _check_code(code, size, label, row):
+
+    if code is None:
+        return None
+    if (not isinstance(code, str) or not code.isascii() or not code.isalpha()
+            or len(code) > size):
+        raise ValueError("Invalid %s code %r in row %s." % (label, code, row))
+    return code
+
+
+# =============================================================================
+def _parse_row(data, row=None):
+    """
+    Converts a record of an external dataset (a dict with the keys code2,
+    code3, numcode, name and flag or a sequence in this order) into a row
+    like in _cdata. Invalid values raise a ValueError naming the row.
+    """
+
+    if isinstance(data, dict):
+        data = [data.get(key) for key in ('code2', 'code3', 'numcode', 'name', 'flag')]
+    data = [None if v is None or v == '' else v for v in data]
+    data.extend([None] * (5 - len(data)))
+    if row is None:
+        row = repr(data)
+
+    code2, code3, numcode, name, flag = data[:5]
+    if name is None:
+        raise ValueError("Country without a name in row %s." % (row))
+    code2 = _check_code(code2, 2, '2-letter', row)
+    code3 = _check_code(code3, 3, '3-letter', row)
+    if numcode is not None:
+        try:
+            numcode = int(numcode)
+        except (TypeError, ValueError):
+            numcode = None
+        if numcode is None or not 0 <= numcode <= 999:
+            raise ValueError(
+                "Invalid numeric code %r in row %s." % (data[2], row))
+    if flag is None:
+        flag = CNT_F_REGULAR
+    elif str(flag).lower() in _FLAG_NAMES:
+        flag = _FLAG_NAMES[str(flag).lower()]
+    else:
+        try:
+            flag = int(flag)
+        except (TypeError, ValueError):
+            pass
+    if flag not in (CNT_F_REGULAR, CNT_F_OLD, CNT_F_REGION):
+        raise ValueError("Invalid flag %r of country %r in row %s." % (flag, name, row))
+
+    return (code2, code3, numcode, str(name), flag)
+
+
+# =============================================================================
+def _read_source(path):
+    """
+    Reads the rows of an external dataset in CSV (with a header line
+    code2,code3,numcode,name,flag) or JSON format (a list of objects
+    or lists) and returns them with the SHA-256 digest of the file.
+    Rows are counted from 1, in CSV files after the header line.
+    """
+
+    import hashlib
+    import io
+
+    with open(path, 'rb') as f:
+        raw = f.read()
+    digest = hashlib.sha256(raw).digest()
+    text = raw.decode('utf-8-sig')
+
+    if path.lower().endswith('.json'):
+        import json
+        records = json.loads(text)
+    else:
+        import csv
+        records = list(csv.DictReader(io.StringIO(text)))
+
+    return [_parse_row(data, i) for i, data in enumerate(records, 1)], digest
+
+
+# =============================================================================
+def _cache_blob(rows, digest):
+
+    import marshal
+    import struct
+
+    countries = tuple(
+        Country(data[3], data[0], data[1], data[2], data[4]) for data in rows)
+    rows = tuple(
+        (c.two_letter, c.three_letter, c.numcode, c.name, c.flag)
+        for c in countries)
+    header = struct.pack(
+        _CACHE_HEADER, _CACHE_MAGIC, _CACHE_FORMAT, marshal.version, digest)
+    return header + marshal.dumps((rows, _build_indexes(countries)))
+
+
+# =============================================================================
+def compile_registry(source, target):
+    """
+    Compiles an external dataset (CSV or JSON, see reload()) with all
+    its indexes into a binary cache file, which is loaded by reload()
+    without parsing the source and without building the indexes. The
+    dataset is checked for duplicate codes by check_data() here. Returns
+    the number of countries.
+    """
+
+    import os
+
+    rows, digest = _read_source(source)
+    check_data(rows)
+
+    tmp = '%s.%d.tmp' % (target, os.getpid())
+    with open(tmp, 'wb') as f:
+        f.write(_cache_blob(rows, digest))
+    os.replace(tmp, target)
+
+    return len(rows)
+
+
+# =============================================================================
+def _load_cache(path):
+    """
+    Loads a binary cache file and returns the rows, the tuple of their
+    indexes for Registry() and the SHA-256 digest of its source.
+    """
+
+    import marshal
+    import struct
+
+    with open(path, 'rb') as f:
+        raw = f.read()
+
+    size = struct.calcsize(_CACHE_HEADER)
+    if len(raw) < size:
+        raise ValueError("%r is no country cache." % (path))
+    magic, fmt, version, digest = struct.unpack_from(_CACHE_HEADER, raw)
+    if magic != _CACHE_MAGIC or fmt != _CACHE_FORMAT:
+        raise ValueError("%r is no country cache of format %d." % (path, _CACHE_FORMAT))
+    if version != marshal.version:
+        raise ValueError("%r was compiled by another Python version." % (path))
+
+    try:
+        rows, indexes = marshal.loads(raw[size:])
+    except (EOFError, TypeError, ValueError):
+        raise ValueError("%r is a damaged country cache." % (path))
+    if len(indexes) != 4 or not all(isinstance(index, dict) for index in indexes):
+        raise ValueError("%r is a damaged country cache." % (path))
+
+    return rows, indexes, digest
+
+
+# =============================================================================
+def _is_cache(path):
+
+    with open(path, 'rb') as f:
+        return f.read(len(_CACHE_MAGIC)) == _CACHE_MAGIC
+
+
+# =============================================================================
+def _current_cache(source, cache):
+    """
+    Returns the rows and their indexes from the cache file of the given
+    source, the cache file is compiled before, if it is missing, damaged
+    or was compiled from another content of the source.
+    """
+
+    import hashlib
+    import os
+
+    with open(source, 'rb') as f:
+        digest = hashlib.sha256(f.read()).digest()
+
+    if os.path.exists(cache):
+        try:
+            rows, indexes, cache_digest = _load_cache(cache)
+            if cache_digest == digest:
+                return rows, indexes
+        except ValueError:
+            pass
+
+    compile_registry(source, cache)
+    return _load_cache(cache)[:2]
+
+
+# =============================================================================
+def reload(source=None, cache=None):
+    """
+    Replaces the registry by the countries of an external dataset and
+    returns the new Registry snapshot.
+
+    source may be a CSV file with the header line code2,code3,numcode,
+    name,flag, a JSON file (ending with .json) with a list of objects with
+    these keys, or a binary cache file compiled by compile_registry().
+    The flag may be given as number or as regular, old or region.
+    Without a source the built-in _cdata is loaded again.
+
+    If cache is given, the compiled cache of the source with all indexes
+    is loaded from this path, it is compiled before, if it does not exist
+    or does not belong to the current content of the source.
+
+    The new snapshot is built completely before it replaces the current
+    one at once, so concurrent lookups get either the old or the new
+    countries, never a mixture. Lookups running during the reload finish
+    on the old snapshot.
+    """
+
+    global _registry
+
+    indexes = None
+    if source is None:
+        rows = _rows_of_cdata()
+    elif _is_cache(source):
+        rows, indexes = _load_cache(source)[:2]
+    elif cache is not None:
+        rows, indexes = _current_cache(source, cache)
+    else:
+        rows = _read_source(source)[0]
+
+    reg = Registry(rows, indexes)
+    with _registry_lock:
+        _registry = reg
+
+    cache_clear()
+    return reg
+
+
+# =============================================================================
+# Localized country names
+
+_LOCALE_MAGIC = b'GEOL'
+_LOCALE_FORMAT = 2
+# magic, format version, byte order (0 little, 1 big), number of names,
+# size of the names, size of the normalized names
+_LOCALE_HEADER = '<4sHHIII'
+_LOCALE_SUFFIX = '.geol'
+# size of the keys of the countries, see _locale_key()
+_LOCALE_KEY_SIZE = 4
+
+
+# =============================================================================
+class LocaleNames(object):
+    """
+    Memory-mapped table of the country names of one locale.
+
+    The table consists of the sorted keys of the countries (see
+    _locale_key()), the names in the same order and the normalized names in sorted order
+    for the reverse lookup, all read directly from the mapping. So the
+    pages of a table are shared by all processes using the same file.
+    """
+
+    __slots__ = (
+        'locale', 'count', 'buf', 'keys_pos', 'offsets', 'order',
+        'norm_offsets', 'names', 'norms')
+
+    # -------------------------------------------------------------------------
+    def __init__(self, locale, path):
+
+        import mmap
+        import struct
+
+        with open(path, 'rb') as f:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        size = struct.calcsize(_LOCALE_HEADER)
+        if len(buf) < size:
+            raise ValueError("%r is no table of country names." % (path))
+        magic, fmt, byteorder, count, names_size, norms_size = struct.unpack_from(
+            _LOCALE_HEADER, buf)
+        if magic != _LOCALE_MAGIC or fmt != _LOCALE_FORMAT:
+            raise ValueError("%r is no table of country names of format %d." % (
+                path, _LOCALE_FORMAT))
+        if byteorder != (0 if sys.byteorder == 'little' else 1):
+            raise ValueError("%r was compiled for another byte order." % (path))
+
+        mv = memoryview(buf)
+        pos = size
+        columns = []
+        for width, fmt_char in (
+                (_LOCALE_KEY_SIZE * count, None), (4 * (count + 1), 'I'), (2 * count, 'H'),
+                (4 * (count + 1), 'I'), (names_size, None), (norms_size, None)):
+            column = mv[pos:pos + width]
+            columns.append(column.cast(fmt_char) if fmt_char else column)
+            pos += width
+        if pos != len(buf):
+            raise ValueError("%r has an invalid size." % (path))
+
+        self.locale = locale
+        self.count = count
+        self.buf = buf
+        self.keys_pos = size
+        self.offsets = columns[1]
+        self.order = columns[2]
+        self.norm_offsets = columns[3]
+        self.names = columns[4]
+        self.norms = columns[5]
+
+    # -------------------------------------------------------------------------
+    def __len__(self):
+        return self.count
+
+    # -------------------------------------------------------------------------
+    def name(self, key):
+        """Returns the name for the given key (as bytes) or None."""
+
+        buf = self.buf
+        base = self.keys_pos
+        lo = 0
+        hi = self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            pos = base + _LOCALE_KEY_SIZE * mid
+            found = buf[pos:pos + _LOCALE_KEY_SIZE]
+            if found < key:
+                lo = mid + 1
+            elif found > key:
+                hi = mid
+            else:
+                offsets = self.offsets
+                return str(self.names[offsets[mid]:offsets[mid + 1]], 'utf-8')
+        return None
+
+    # -------------------------------------------------------------------------
+    def key_of(self, normalized):
+        """
+        Returns the key (as bytes) of the first country with the given
+        normalized name or None.
+        """
+
+        target = normalized.encode('utf-8')
+        norms = self.norms
+        norm_offsets = self.norm_offsets
+        lo = 0
+        hi = self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if norms[norm_offsets[mid]:norm_offsets[mid + 1]].tobytes() < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.count and norms[norm_offsets[lo]:norm_offsets[lo + 1]] == target:
+            pos = self.keys_pos + _LOCALE_KEY_SIZE * self.order[lo]
+            return self.buf[pos:pos + _LOCALE_KEY_SIZE]
+        return None
+
+
+# =============================================================================
+def _locale_key(c):
+    """
+    Returns the key of the country in the tables of localized names,
+    unique for every row: the digit of its flag followed by the 3-letter
+    code, the 2-letter code or the zero padded numeric code, e.g. b'1DEU',
+    b'1AQ ' or b'2180' for Zaire. None for a country without any code.
+    """
 
     if c.three_letter:
-        key = c.three_letter.lower()
-        if key in _three_letter:
-            warnings.warn((
-                "Three letter code %r already exists." % (key)), RuntimeWarning)
+        code = c.three_letter
+    elif c.two_letter:
+        code = c.two_letter
+    elif c.numcode is not None:
+        code = '%03d' % (c.numcode)
+    else:
+        return None
+    return ('%d%-3s' % (c.flag, code.upper())).encode('ascii')
+
+
+# =============================================================================
+def _locale_country(reg, key):
+    """Returns the index of the country of reg with the given locale key or None."""
+
+    return _find_index(reg, key[1:].decode('ascii').strip(), int(key[:1]))
+
+
+# =============================================================================
+def _locale_candidates(locale):
+    """
+    Returns the names of the tables to try for the given locale, e.g.
+    ('pt_BR', 'pt') for 'pt-br.UTF-8'.
+    """
+
+    name = str(locale).split('.')[0].split('@')[0].replace('-', '_')
+    parts = name.split('_')
+    language = parts[0].lower()
+    if len(parts) > 1 and parts[1]:
+        return (language + '_' + parts[1].upper(), language)
+    return (language, )
+
+
+# =============================================================================
+def set_locale_path(*dirs):
+    """
+    Sets the directories to search for the tables of localized names
+    (<locale>.geol, see compile_locale()) and unloads all loaded tables.
+    Without any directory the path is taken from the environment variable
+    GEO_COUNTRIES_LOCALE_PATH or is the directory 'locales' beside this
+    module.
+    """
+
+    global _locale_path, _locales
+
+    with _locale_lock:
+        _locale_path = tuple(dirs) if dirs else None
+        _locales = {}
+
+
+# =============================================================================
+def _get_locale_path():
+
+    import os
+
+    if _locale_path is not None:
+        return _locale_path
+    env = os.environ.get('GEO_COUNTRIES_LOCALE_PATH')
+    if env:
+        return tuple(d for d in env.split(os.pathsep) if d)
+    return (os.path.join(os.path.dirname(os.path.abspath(__file__)), 'locales'), )
+
+
+# =============================================================================
+def _get_locale(locale):
+    """
+    Returns the LocaleNames of the given locale (or of its language) or
+    None, if there is no table for it. A table is mapped on first use.
+    """
+
+    names = _locales.get(locale)
+    if names is not None or locale in _locales:
+        return names
+
+    import os
+
+    with _locale_lock:
+        if locale in _locales:
+            return _locales[locale]
+        names = None
+        for candidate in _locale_candidates(locale):
+            for directory in _get_locale_path():
+                path = os.path.join(directory, candidate + _LOCALE_SUFFIX)
+                if os.path.exists(path):
+                    names = LocaleNames(candidate, path)
+                    break
+            if names is not None:
+                break
+        _locales[locale] = names
+
+    return names
+
+
+# =============================================================================
+def loaded_locales():
+    """Returns the sorted tuple of the locales of all mapped tables."""
+
+    return tuple(sorted(set(
+        names.locale for names in _locales.values() if names is not None)))
+
+
+# =============================================================================
+def _localized_name(c, locale):
+
+    names = _get_locale(locale)
+    if names is not None:
+        key = _locale_key(c)
+        if key is not None:
+            name = names.name(key)
+            if name is not None:
+                return name
+    return c.name
+
+
+# =============================================================================
+def _collation_key(locale):
+    """
+    Returns the function giving the sort key of a name: the sort key of the
+    ICU collator of the locale, if PyICU is installed, otherwise the name
+    normalized by _normalize_name() (case and accent insensitive).
+    """
+
+    if locale is not None:
+        try:
+            import icu
+        except ImportError:
+            pass
         else:
-            _three_letter[key] = index
+            locale = _locale_candidates(locale)[0]
+            return icu.Collator.createInstance(icu.Locale(locale)).getSortKey
 
-    if c.numcode is not None:
-        if c.numcode in _numeric:
-            warnings.warn((
-                "Numeric code %r already exists." % (c.numcode)), RuntimeWarning)
+    def key(name):
+        return (_normalize_name(name), name)
+    return key
+
+
+# =============================================================================
+def sorted_countries(by=CNT_I_COUNTRY, flags=CNT_F_ANY, locale=None):
+    """
+    Returns the tuple of all countries matching flags sorted by the field
+    by (one of the CNT_I_* constants, countries without a value last),
+    e.g. for drop-down lists.
+
+    Names are sorted case and accent insensitive, with a locale by their
+    localized names (see Country.localized_name()) collated by ICU, if
+    PyICU is installed. Every order is built once per field, flags and
+    locale and shared by all callers.
+    """
+
+    reg = _registry
+    if reg is None:
+        reg = _build_registry()
+
+    if by != CNT_I_COUNTRY:
+        locale = None
+    names = None if locale is None else _get_locale(locale)
+
+    order_key = (by, flags, locale)
+    entry = reg._sort_orders.get(order_key)
+    # the entry of a locale is outdated, if its table was unloaded
+    if entry is not None and entry[0] is names:
+        return entry[1]
+
+    attr = field_attribute(by)
+    _check_flags(flags)
+    selected = [c for c in reg.countries if flags & c.flag]
+    if by == CNT_I_COUNTRY:
+        collation_key = _collation_key(locale)
+        if names is None:
+            keys = [collation_key(c.name) for c in selected]
+        else:
+            keys = [collation_key(_localized_name(c, locale)) for c in selected]
+    else:
+        keys = []
+        for c in selected:
+            value = getattr(c, attr)
+            keys.append((True, 0) if value is None else (False, value))
+
+    order = tuple(selected[i] for i in sorted(range(len(selected)), key=keys.__getitem__))
+    reg._sort_orders[order_key] = (names, order)
+    return order
+
+
+# =============================================================================
+def localized_country(name, locale, flags=CNT_F_ANY):
+    """
+    Returns the Country with the given name in the given locale (case
+    and accent insensitive, e.g. 'deutschland' for 'de'), or None.
+    """
+
+    _check_flags(flags)
+    names = _get_locale(locale)
+    if names is None:
+        return None
+
+    key = names.key_of(_normalize_name(str(name)))
+    if key is None or not flags & int(key[:1]):
+        return None
+
+    reg = _registry
+    if reg is None:
+        reg = _build_registry()
+    index = _locale_country(reg, key)
+    return None if index is None else reg.countries[index]
+
+
+# =============================================================================
+def compile_locale(source, target):
+    """
+    Compiles the country names of a locale into a table, which is
+    memory-mapped on first use of the locale (see set_locale_path()).
+
+    source is a CSV file with the header line key,name or a JSON file
+    (ending with .json) with an object of keys to names. The keys may be
+    any keys accepted by country(), with a prefix old:, regular: or region:
+    for the countries of this flag only, e.g. 'old:180' for Zaire instead
+    of the Democratic Republic of the Congo. Unknown keys and duplicate
+    countries emit a RuntimeWarning and are skipped. Returns the number
+    of names.
+    """
+
+    import io
+    import os
+    import struct
+    from array import array
+
+    with open(source, 'rb') as f:
+        text = f.read().decode('utf-8-sig')
+    if source.lower().endswith('.json'):
+        import json
+        records = list(json.loads(text).items())
+    else:
+        import csv
+        records = [(r['key'], r['name']) for r in csv.DictReader(io.StringIO(text))]
+
+    entries = {}
+    reg = _registry
+    if reg is None:
+        reg = _build_registry()
+
+    for key, name in records:
+        flags = CNT_F_ANY
+        prefix, sep, code = str(key).partition(':')
+        if sep and prefix.strip().lower() in _FLAG_NAMES:
+            flags = _FLAG_NAMES[prefix.strip().lower()]
+            key = code
+        index = _find_index(reg, key, flags)
+        lkey = None if index is None else _locale_key(reg.countries[index])
+        if index is None:
+            warnings.warn("Unknown country %r." % (key), RuntimeWarning, stacklevel=2)
+        elif lkey is None:
+            warnings.warn(
+                "Country %r has no locale key." % (key), RuntimeWarning, stacklevel=2)
+        elif lkey in entries:
+            warnings.warn(
+                "Duplicate name of country %r." % (key), RuntimeWarning, stacklevel=2)
+        else:
+            entries[lkey] = str(name).strip()
+
+    keys = sorted(entries)
+    names = bytearray()
+    offsets = array('I', [0])
+    for key in keys:
+        names += entries[key].encode('utf-8')
+        offsets.append(len(names))
+
+    normalized = sorted(
+        (_normalize_name(entries[key]).encode('utf-8'), i)
+        for i, key in enumerate(keys))
+    norms = bytearray()
+    norm_offsets = array('I', [0])
+    order = array('H')
+    for norm, i in normalized:
+        norms += norm
+        norm_offsets.append(len(norms))
+        order.append(i)
+
+    header = struct.pack(
+        _LOCALE_HEADER, _LOCALE_MAGIC, _LOCALE_FORMAT,
+        0 if sys.byteorder == 'little' else 1, len(keys), len(names), len(norms))
+    blob = b''.join((
+        header, b''.join(keys), offsets.tobytes(), order.tobytes(),
+        norm_offsets.tobytes(), bytes(names), bytes(norms)))
+
+    tmp = '%s.%d.tmp' % (target, os.getpid())
+    with open(tmp, 'wb') as f:
+        f.write(blob)
+    os.replace(tmp, target)
+
+    return len(keys)
+
+
+# =============================================================================
+def __getattr__(name):
+    """
+    Returns the indexes of the current registry under their former names
+    of module globals, e.g. geo_countries._country, and builds the registry
+    on first access.
+    """
+
+    if name in _REGISTRY_NAMES:
+        return getattr(registry(), _REGISTRY_NAMES[name])
+
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+
+# =============================================================================
+# Command line interface: python -m geo_countries
+
+_CLI_FORMATS = ('csv', 'tsv', 'jsonl')
+_CLI_FLAGS = {
+    'regular': CNT_F_REGULAR,
+    'old': CNT_F_OLD,
+    'region': CNT_F_REGION,
+    'any': CNT_F_ANY,
+}
+_CLI_FIELDS = ('code2', 'code3', 'numcode', 'name')
+
+
+# =============================================================================
+def _enrich_values(keys, flags):
+    """
+    Resolves the given column values and returns a list of the appended
+    values (code2, code3, numcode, name) for every value and the number
+    of misses.
+    """
+
+    keys = ['' if key is None else key for key in keys]
+    try:
+        found = countries(keys, flags)
+    except (TypeError, OverflowError):
+        # e.g. JSON objects or arrays or 1e400 as values
+        found = []
+        for key in keys:
+            try:
+                found.append(countries((key, ), flags)[0])
+            except (TypeError, OverflowError):
+                found.append(None)
+
+    misses = 0
+    result = []
+    for c in found:
+        if c is None:
+            misses += 1
+            result.append((None, None, None, None))
+        else:
+            result.append((c.two_letter, c.three_letter, c.numcode, c.name))
+
+    return result, misses
+
+
+# =============================================================================
+def _csv_options(fmt, write=False):
+    """
+    Returns the keyword arguments for csv.reader() (or csv.writer() with
+    write) for the format csv or tsv. TSV has no quoting at all, on output
+    tabs, newlines and backslashes in fields are escaped by a backslash.
+    """
+
+    import csv
+
+    if fmt != 'tsv':
+        return {'delimiter': ','}
+    options = {'delimiter': '\t', 'quoting': csv.QUOTE_NONE}
+    if write:
+        options.update(quotechar=None, escapechar='\\')
+    return options
+
+
+# =============================================================================
+def _enrich_chunk(task):
+    """
+    Enriches a chunk of input records and returns the formatted output
+    text and the number of misses. Used directly or in worker processes.
+
+    For the formats csv and tsv the records are lists of fields and
+    the column is an index, for jsonl they are tuples of the location
+    (file name and line number) and the raw line and the column is a key
+    of the JSON objects. A line, which is no JSON object, raises a
+    ValueError with its location.
+    """
+
+    import io
+
+    fmt, column, flags, records = task
+    out = io.StringIO()
+
+    if fmt == 'jsonl':
+        import json
+        objects = []
+        for location, line in records:
+            try:
+                obj = json.loads(line)
+            except ValueError as e:
+                raise ValueError("%s: invalid JSON: %s" % (location, e))
+            if not isinstance(obj, dict):
+                raise ValueError("%s: no JSON object." % (location))
+            objects.append(obj)
+        values, misses = _enrich_values(
+            [obj.get(column) for obj in objects], flags)
+        for obj, appended in zip(objects, values):
+            obj.update(zip(_CLI_FIELDS, appended))
+            out.write(json.dumps(obj, ensure_ascii=False))
+            out.write('\n')
+        return out.getvalue(), misses
+
+    import csv
+    writer = csv.writer(out, lineterminator='\n', **_csv_options(fmt, True))
+    values, misses = _enrich_values(
+        [row[column] if column < len(row) else None for row in records], flags)
+    for row, appended in zip(records, values):
+        writer.writerow(row + ['' if v is None else v for v in appended])
+    return out.getvalue(), misses
+
+
+# =============================================================================
+def _cli_tasks(streams, fmt, column, header, flags, chunk_size, out):
+    """
+    Generates the tasks for _enrich_chunk() with chunks of at most
+    chunk_size records from all input streams. For csv and tsv the
+    header line of the first stream is written directly to out.
+    """
+
+    import csv
+
+    first = True
+
+    for stream in streams:
+
+        if fmt == 'jsonl':
+            name = getattr(stream, 'name', '-')
+            records = (
+                ('%s, line %d' % (name, number), line)
+                for number, line in enumerate(stream, 1) if line.strip())
+            index = column
         else:
-            _numeric[c.numcode] = index
+            records = csv.reader(stream, **_csv_options(fmt))
+            index = column
+            if header:
+                names = next(records, None)
+                if names is None:
+                    continue
+                if column in names:
+                    index = names.index(column)
+                elif column.isdigit():
+                    index = int(column)
+                else:
+                    raise ValueError(
+                        "Column %r not found in header %r." % (column, names))
+                if first:
+                    writer = csv.writer(
+                        out, lineterminator='\n', **_csv_options(fmt, True))
+                    writer.writerow(names + list(_CLI_FIELDS))
+            elif column.isdigit():
+                index = int(column)
+            else:
+                raise ValueError(
+                    "Column %r must be an index without a header." % (column))
+        first = False
+
+        chunk = []
+        for record in records:
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                yield (fmt, index, flags, chunk)
+                chunk = []
+        if chunk:
+            yield (fmt, index, flags, chunk)
+
+
+# =============================================================================
+def _cli_run(tasks, jobs, out):
+    """
+    Performs all tasks, with more than one job in a pool of processes,
+    and writes the results in the order of the input to out.
+    Returns the number of rows and the number of misses.
+    """
+
+    rows = 0
+    misses = 0
+
+    if jobs <= 1:
+        for task in tasks:
+            text, task_misses = _enrich_chunk(task)
+            out.write(text)
+            rows += len(task[3])
+            misses += task_misses
+        return rows, misses
+
+    from collections import deque
+    from concurrent.futures import ProcessPoolExecutor
+
+    # Bounds the number of chunks in flight to keep the memory constant
+    pending = deque()
+    with ProcessPoolExecutor(jobs) as executor:
+        for task in tasks:
+            pending.append((len(task[3]), executor.submit(_enrich_chunk, task)))
+            while len(pending) > jobs * 2 or (pending and pending[0][1].done()):
+                count, future = pending.popleft()
+                text, task_misses = future.result()
+                out.write(text)
+                rows += count
+                misses += task_misses
+        while pending:
+            count, future = pending.popleft()
+            text, task_misses = future.result()
+            out.write(text)
+            rows += count
+            misses += task_misses
+
+    return rows, misses
+
+
+# =============================================================================
+def main(argv=None):
+    """
+    Streams CSV, TSV or JSON lines from the given files or stdin, resolves
+    the chosen column and appends the columns code2, code3, numcode
+    and name of the found countries.
+    """
+
+    import argparse
+    import time
+
+    arg_parser = argparse.ArgumentParser(
+        prog='python -m geo_countries',
+        description=(
+            "Appends the 2-letter, 3-letter and numeric code and the name "
+            "of the country in the given column to every record."))
+    arg_parser.add_argument(
+        'files', nargs='*', metavar='FILE',
+        help="Input files, '-' or none for reading from stdin.")
+    arg_parser.add_argument(
+        "-c", "--column", required=True, dest='column',
+        help="Name (index without header) of the column or JSON key to resolve.")
+    arg_parser.add_argument(
+        "-f", "--format", choices=_CLI_FORMATS, dest='format',
+        help="Format of input and output, default by file extension or csv.")
+    arg_parser.add_argument(
+        "--no-header", action="store_false", dest='header',
+        help="CSV and TSV input has no header line.")
+    arg_parser.add_argument(
+        "--flags", choices=sorted(_CLI_FLAGS), default='any', dest='flags',
+        help="Type of countries to resolve (default: %(default)s).")
+    arg_parser.add_argument(
+        "-j", "--jobs", type=int, default=1, dest='jobs',
+        help="Number of worker processes (default: %(default)s).")
+    arg_parser.add_argument(
+        "--chunk-size", type=int, default=10000, dest='chunk_size',
+        help="Number of records per chunk (default: %(default)s).")
+    arg_parser.add_argument(
+        "-o", "--output", default='-', dest='output',
+        help="Output file, default stdout.")
+    arg_parser.add_argument(
+        "-q", "--quiet", action="store_true", dest='quiet',
+        help="Don't report the statistics on stderr.")
+    args = arg_parser.parse_args(argv)
+
+    if args.jobs < 1 or args.chunk_size < 1:
+        arg_parser.error("The number of jobs and the chunk size must be positive.")
+
+    files = args.files or ['-']
+    fmt = args.format
+    if fmt is None:
+        fmt = 'csv'
+        ext = files[0].rsplit('.', 1)[-1].lower()
+        if ext == 'tsv':
+            fmt = 'tsv'
+        elif ext in ('jsonl', 'ndjson'):
+            fmt = 'jsonl'
+
+    def streams():
+        for name in files:
+            if name == '-':
+                yield sys.stdin
+            else:
+                with open(name, encoding='utf-8', newline='') as stream:
+                    yield stream
+
+    out = sys.stdout
+    start = time.time()
+    try:
+        if args.output != '-':
+            out = open(args.output, 'w', encoding='utf-8', newline='')
+        tasks = _cli_tasks(
+            streams(), fmt, args.column, args.header, _CLI_FLAGS[args.flags],
+            args.chunk_size, out)
+        rows, misses = _cli_run(tasks, args.jobs, out)
+    except (ValueError, OSError) as e:
+        sys.stderr.write("%s: %s\n" % (arg_parser.prog, e))
+        return 1
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    if not args.quiet:
+        duration = time.time() - start
+        rate = rows / duration if duration > 0 else 0.0
+        sys.stderr.write("%d rows, %d misses in %.3f s (%.0f rows/s)\n" % (
+            rows, misses, duration, rate))
+
+    return 0
 
 
 # =============================================================================
 
 if __name__ == "__main__":
 
-    pass
+    sys.exit(main())
 
 # =============================================================================
 
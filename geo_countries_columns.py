@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank@brehm-online.com
+@copyright: © 2015 by Frank Brehm, Berlin
+@summary: Conversion of pandas and pyarrow columns between country code
+          systems (2-letter, 3-letter, numerical code and name).
+"""
+
+# Own modules
+from geo_countries import country, field_attribute, CNT_F_ANY
+from geo_countries import CNT_I_CODE3, CNT_I_NUMCODE, CNT_I_FLAG
+
+__author__ = 'Frank Brehm <frank@brehm-online.com>'
+__copyright__ = '(C) 2015 by Frank Brehm, Berlin'
+__contact__ = 'frank@brehm-online.com'
+__license__ = 'LGPLv3+'
+
+
+# =============================================================================
+def translation_table(values, to=CNT_I_CODE3, source=None, flags=CNT_F_ANY):
+    """
+    Translates the given distinct values into the code system 'to'
+    and returns a list of the results aligned to the values (None for
+    values, which could not be mapped).
+
+    If source is None, the values are resolved with country(), so any
+    kind of key is accepted. Otherwise only values of the field 'source'
+    of the registry are mapped (codes and names case insensitive).
+    """
+
+    from geo_countries import registry
+
+    to_attr = field_attribute(to)
+
+    if source is None:
+        result = []
+        for value in values:
+            c = country(value, flags)
+            result.append(None if c is None else getattr(c, to_attr))
+        return result
+
+    source_attr = field_attribute(source)
+    table = {}
+    for c in registry().countries:
+        if not flags & c.flag:
+            continue
+        key = getattr(c, source_attr)
+        if key is None:
+            continue
+        if isinstance(key, str):
+            key = key.casefold()
+        table.setdefault(key, getattr(c, to_attr))
+
+    numeric = source in (CNT_I_NUMCODE, CNT_I_FLAG)
+    result = []
+    for value in values:
+        if numeric and not isinstance(value, int):
+            try:
+                value = int(value)
+            except (TypeError, ValueError):
+                value = None
+        elif isinstance(value, str):
+            value = value.strip().casefold()
+        result.append(table.get(value))
+    return result
+
+
+# =============================================================================
+def convert_series(series, to=CNT_I_CODE3, source=None, flags=CNT_F_ANY):
+    """
+    Converts a pandas Series of country keys into the code system 'to'.
+
+    The Series is encoded as a categorical, only its distinct values are
+    translated with translation_table() and the result is taken from
+    the translated categories. Nulls are preserved.
+
+    Returns a tuple of the converted Series (with the same index and name)
+    and a dict of the unmapped values with their number of occurrences.
+    """
+
+    import numpy
+    import pandas
+
+    categorical = series.astype('category')
+    categories = list(categorical.cat.categories)
+    mapped = translation_table(categories, to, source, flags)
+
+    codes = categorical.cat.codes.to_numpy()
+    # The code -1 of nulls takes the trailing None
+    translated = numpy.array(mapped + [None], dtype=object)
+    result = pandas.Series(
+        translated[codes], index=series.index, name=series.name)
+    if to in (CNT_I_NUMCODE, CNT_I_FLAG):
+        result = result.astype('Int64')
+
+    unmapped = {}
+    if None in mapped:
+        counts = numpy.bincount(codes[codes >= 0], minlength=len(categories))
+        for value, target, count in zip(categories, mapped, counts.tolist()):
+            if target is None and count:
+                unmapped[value] = count
+
+    return result, unmapped
+
+
+# =============================================================================
+def _arrow_type(pyarrow, field):
+
+    if field in (CNT_I_NUMCODE, CNT_I_FLAG):
+        return pyarrow.int32()
+    return pyarrow.string()
+
+
+# =============================================================================
+def _convert_arrow_chunk(pyarrow, array, to, source, flags, unmapped):
+
+    if not pyarrow.types.is_dictionary(array.type):
+        array = array.dictionary_encode()
+
+    mapped = translation_table(
+        array.dictionary.to_pylist(), to, source, flags)
+    result = pyarrow.array(mapped, type=_arrow_type(pyarrow, to))
+    result = result.take(array.indices)
+
+    if None in mapped:
+        dictionary = array.dictionary.to_pylist()
+        for item in array.indices.value_counts().to_pylist():
+            index = item['values']
+            if index is not None and mapped[index] is None:
+                value = dictionary[index]
+                unmapped[value] = unmapped.get(value, 0) + item['counts']
+
+    return result
+
+
+# =============================================================================
+def convert_arrow(array, to=CNT_I_CODE3, source=None, flags=CNT_F_ANY):
+    """
+    Converts a pyarrow Array or ChunkedArray of country keys into the code
+    system 'to'.
+
+    Every chunk is dictionary encoded, only the dictionary is translated
+    with translation_table() and the result is taken from the translated
+    dictionary. Nulls are preserved.
+
+    Returns a tuple of the converted Array or ChunkedArray and a dict
+    of the unmapped values with their number of occurrences.
+    """
+
+    import pyarrow
+
+    unmapped = {}
+    if isinstance(array, pyarrow.ChunkedArray):
+        chunks = [
+            _convert_arrow_chunk(pyarrow, chunk, to, source, flags, unmapped)
+            for chunk in array.chunks]
+        result = pyarrow.chunked_array(chunks, type=_arrow_type(pyarrow, to))
+        return result, unmapped
+
+    result = _convert_arrow_chunk(pyarrow, array, to, source, flags, unmapped)
+    return result, unmapped
+
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
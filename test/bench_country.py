@@ -0,0 +1,1385 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank@brehm-online.com
+@copyright: © 2015 by Frank Brehm, Berlin
+@license: GPL3
+@summary: benchmarks for geo_countries.py
+"""
+
+import os
+import sys
+import json
+import logging
+import argparse
+import platform
+import subprocess
+import timeit
+import random
+import tracemalloc
+
+libdir = os.path.abspath(os.path.join(os.path.dirname(sys.argv[0]), '..'))
+sys.path.insert(0, libdir)
+
+
+# =============================================================================
+
+log = logging.getLogger('bench_country')
+
+BENCHMARKS = []
+
+
+# =============================================================================
+def benchmark(name):
+    """
+    Decorator to register a benchmark.
+
+    The decorated function gets the number of keys to use and must return
+    a tuple of the number of processed keys and a callable performing
+    the work to measure, optionally followed by a callable cleaning up
+    after all repetitions (e.g. removing temporary files).
+    """
+
+    def register(func):
+        BENCHMARKS.append((name, func))
+        return func
+
+    return register
+
+
+# =============================================================================
+def sample_keys(size, seed=42):
+    """Returns a reproducible list of mixed keys for all key types."""
+
+    import geo_countries
+
+    rnd = random.Random(seed)
+    pool = []
+    for c in geo_countries._country:
+        if c.numcode is not None:
+            pool.append(c.numcode)
+            pool.append(str(c.numcode))
+        if c.two_letter:
+            pool.append(c.two_letter)
+        if c.three_letter:
+            pool.append(c.three_letter.lower())
+    pool.extend(('xx', 'unknown', 999))
+
+    return [rnd.choice(pool) for i in range(size)]
+
+
+# =============================================================================
+@benchmark('scalar loop country()')
+def bench_scalar_loop(size):
+
+    from geo_countries import country
+
+    keys = sample_keys(size)
+
+    def run():
+        return [country(key) for key in keys]
+
+    return len(keys), run
+
+
+# =============================================================================
+@benchmark('bulk countries()')
+def bench_bulk(size):
+
+    from geo_countries import countries
+
+    keys = sample_keys(size)
+
+    def run():
+        return countries(keys)
+
+    return len(keys), run
+
+
+# =============================================================================
+@benchmark('bulk countries() numpy int array')
+def bench_bulk_numpy(size):
+
+    try:
+        import numpy
+    except ImportError:
+        return None
+    import geo_countries
+    from geo_countries import countries
+
+    rnd = random.Random(42)
+    pool = [c.numcode for c in geo_countries._country if c.numcode is not None]
+    pool.append(999)
+    keys = numpy.array([rnd.choice(pool) for i in range(size)])
+
+    def run():
+        return countries(keys, as_index=True)
+
+    return len(keys), run
+
+
+# =============================================================================
+LOOKUP_CASES = (
+    ('int hit', 276),
+    ('int miss', 999),
+    ('numeric string hit', '276'),
+    ('numeric string miss', '999'),
+    ('alpha-2 hit', 'DE'),
+    ('alpha-2 lower hit', 'de'),
+    ('alpha-2 miss', 'XX'),
+    ('alpha-3 hit', 'DEU'),
+    ('alpha-3 miss', 'XXX'),
+    ('padded mixed case hit', ' dEu '),
+    ('long string miss', 'not a country'),
+)
+
+
+def _register_lookup_case(title, key):
+
+    @benchmark('country() %s' % (title))
+    def bench_lookup(size):
+
+        from geo_countries import country
+
+        keys = [key] * size
+
+        def run():
+            for k in keys:
+                country(k)
+
+        return size, run
+
+
+for _title, _key in LOOKUP_CASES:
+    _register_lookup_case(_title, _key)
+
+
+# =============================================================================
+FLAG_CASES = (
+    ('regular', 'CNT_F_REGULAR', 276),
+    ('old', 'CNT_F_OLD', 278),
+    ('region', 'CNT_F_REGION', 150),
+    ('regular filtered out', 'CNT_F_REGULAR', 278),
+    ('old filtered out', 'CNT_F_OLD', 276),
+    ('any', 'CNT_F_ANY', 278),
+    ('old colliding code', 'CNT_F_OLD', 180),
+)
+
+
+def _register_flag_case(title, flag_name, key):
+
+    @benchmark('country() flags %s' % (title))
+    def bench_flags(size):
+
+        import geo_countries
+        from geo_countries import country
+
+        flags = getattr(geo_countries, flag_name)
+        keys = [key] * size
+
+        def run():
+            for k in keys:
+                country(k, flags)
+
+        return size, run
+
+
+for _title, _flag_name, _key in FLAG_CASES:
+    _register_flag_case(_title, _flag_name, _key)
+
+
+# =============================================================================
+@benchmark('enumerate regular by filtering _country')
+def bench_enumerate_filter(size):
+
+    import geo_countries
+    from geo_countries import CNT_F_REGULAR
+
+    def run():
+        for i in range(size // 100):
+            tuple(c for c in geo_countries._country if c.flag & CNT_F_REGULAR)
+
+    return size // 100, run
+
+
+@benchmark('enumerate regular with all_countries()')
+def bench_all_countries(size):
+
+    from geo_countries import all_countries, CNT_F_REGULAR
+
+    def run():
+        for i in range(size // 100):
+            all_countries(CNT_F_REGULAR)
+
+    return size // 100, run
+
+
+# =============================================================================
+def _register_stats_case(title, sample_every):
+
+    @benchmark('country() stats %s' % (title))
+    def bench_stats(size):
+
+        import geo_countries
+        from geo_countries import country
+
+        keys = sample_keys(size)
+
+        def run():
+            if sample_every is None:
+                geo_countries.disable_stats()
+            else:
+                geo_countries.enable_stats(sample_every)
+            try:
+                for k in keys:
+                    country(k)
+            finally:
+                geo_countries.disable_stats()
+
+        return size, run
+
+
+_register_stats_case('off', None)
+_register_stats_case('on, no latency', 0)
+_register_stats_case('on, latency 1/64', 64)
+_register_stats_case('on, latency 1/1', 1)
+
+
+# =============================================================================
+def fixed_width_records(size, seed=42):
+    """
+    Returns a buffer of size fixed-width records of 8 bytes with a 3-letter
+    code at offset 0 and a numeric code at offset 4, and the record size.
+    """
+
+    import geo_countries
+
+    rnd = random.Random(seed)
+    pool = [(c.three_letter, c.numcode) for c in geo_countries.registry().countries
+            if c.three_letter and c.numcode is not None]
+    pool.append(('XXX', 999))
+    records = []
+    for i in range(size):
+        code3, numcode = rnd.choice(pool)
+        records.append(('%-4s%03d\n' % (code3, numcode)).encode('ascii'))
+    return b''.join(records), 8
+
+
+@benchmark('fixed-width decode then country()')
+def bench_fixed_width_decode(size):
+
+    from geo_countries import country
+
+    buf, record_size = fixed_width_records(size)
+
+    def run():
+        return [country(buf[pos:pos + 3].decode('ascii'))
+                for pos in range(0, len(buf), record_size)]
+
+    return size, run
+
+
+@benchmark('fixed-width decode then countries()')
+def bench_fixed_width_decode_bulk(size):
+
+    from geo_countries import countries
+
+    buf, record_size = fixed_width_records(size)
+
+    def run():
+        return countries([buf[pos:pos + 3].decode('ascii')
+                          for pos in range(0, len(buf), record_size)])
+
+    return size, run
+
+
+@benchmark('fixed-width bytes slice country()')
+def bench_fixed_width_bytes(size):
+
+    from geo_countries import country
+
+    buf, record_size = fixed_width_records(size)
+
+    def run():
+        return [country(buf[pos:pos + 3]) for pos in range(0, len(buf), record_size)]
+
+    return size, run
+
+
+def _register_scan_case(title, convert):
+
+    @benchmark('fixed-width scan_codes() %s' % (title))
+    def bench_scan_codes(size):
+
+        from geo_countries import scan_codes
+
+        buf, record_size = fixed_width_records(size)
+        buf = convert(buf)
+        offsets = range(0, len(buf), record_size)
+
+        def run():
+            return scan_codes(buf, offsets, 3)
+
+        return size, run
+
+
+_register_scan_case('bytes', bytes)
+_register_scan_case('bytearray', bytearray)
+
+
+# =============================================================================
+def zipf_dirty_keys(size, distinct=2000, exponent=1.1, seed=42):
+    """
+    Returns a reproducible list of dirty raw keys (padded, mixed case,
+    zero padded numbers and misses) with a Zipf distribution.
+    """
+
+    import geo_countries
+
+    rnd = random.Random(seed)
+    pool = []
+    for c in geo_countries._country:
+        if c.two_letter:
+            pool.append(' %s ' % (c.two_letter.lower()))
+        if c.three_letter:
+            pool.append(c.three_letter.capitalize() + ' ')
+            pool.append(c.three_letter.swapcase())
+        if c.numcode is not None:
+            pool.append('%04d ' % (c.numcode))
+    while len(pool) < distinct:
+        pool.append(' unknown-%d ' % (len(pool)))
+    rnd.shuffle(pool)
+    pool = pool[:distinct]
+
+    weights = [1.0 / (rank ** exponent) for rank in range(1, distinct + 1)]
+    return rnd.choices(pool, weights=weights, k=size)
+
+
+def _register_zipf_case(title, cache_size):
+
+    @benchmark('country() zipf dirty keys %s' % (title))
+    def bench_zipf(size):
+
+        from geo_countries import country, set_cache_size
+
+        keys = zipf_dirty_keys(size)
+
+        def run():
+            set_cache_size(cache_size)
+            try:
+                for k in keys:
+                    country(k)
+            finally:
+                set_cache_size()
+
+        return size, run
+
+
+_register_zipf_case('uncached', 0)
+_register_zipf_case('cache 256', 256)
+_register_zipf_case('cache 4096', 4096)
+
+
+# =============================================================================
+@benchmark('country(key).three_letter')
+def bench_country_code3(size):
+
+    from geo_countries import country
+
+    keys = sample_keys(size)
+
+    def run():
+        for key in keys:
+            c = country(key)
+            if c is not None:
+                c.three_letter
+
+    return size, run
+
+
+# =============================================================================
+@benchmark('country(key) all fields into a row')
+def bench_country_row(size):
+
+    from geo_countries import country
+
+    keys = sample_keys(size)
+
+    def run():
+        rows = []
+        for key in keys:
+            c = country(key)
+            if c is not None:
+                rows.append((c.two_letter, c.three_letter, c.numcode, c.name, c.flag))
+        return rows
+
+    return size, run
+
+
+# =============================================================================
+@benchmark('country_codes(key) into a row')
+def bench_country_codes(size):
+
+    from geo_countries import country_codes
+
+    keys = sample_keys(size)
+
+    def run():
+        rows = []
+        for key in keys:
+            codes = country_codes(key)
+            if codes is not None:
+                rows.append(codes)
+        return rows
+
+    return size, run
+
+
+# =============================================================================
+@benchmark('country_codes_all() rows')
+def bench_country_codes_all(size):
+
+    from geo_countries import country_codes_all
+
+    keys = sample_keys(size)
+
+    def run():
+        return country_codes_all(keys)
+
+    return size, run
+
+
+# =============================================================================
+@benchmark('convert(key) to alpha-3')
+def bench_convert(size):
+
+    from geo_countries import convert
+
+    keys = sample_keys(size)
+
+    def run():
+        for key in keys:
+            convert(key)
+
+    return size, run
+
+
+# =============================================================================
+@benchmark('convert(int) to alpha-2')
+def bench_convert_int(size):
+
+    from geo_countries import convert, CNT_I_CODE2
+
+    keys = [k for k in sample_keys(size * 3) if isinstance(k, int)][:size]
+
+    def run():
+        for key in keys:
+            convert(key, CNT_I_CODE2)
+
+    return len(keys), run
+
+
+# =============================================================================
+@benchmark('convert_all() to alpha-3')
+def bench_convert_all(size):
+
+    from geo_countries import convert_all
+
+    keys = sample_keys(size)
+
+    def run():
+        return convert_all(keys)
+
+    return size, run
+
+
+# =============================================================================
+MISSPELLED_NAMES = (
+    'Viet nam', 'Cote d Ivoire', 'Tanzania', 'Germny', 'Untied States',
+    'Rusia', 'Phillipines', 'Kazakstan', 'Swizerland', 'Korea', 'Iran',
+    'Macedonia', 'Moldova', 'Syria', 'Boliva', 'Argentinia', 'Columbia',
+    'Marocco', 'Tunesia', 'Belgum', 'Austira', 'Nethrlands', 'Luxemburg',
+    'Denmak', 'Norwey', 'Finnland', 'Polan', 'Hungray', 'Rumania', 'Ukrane',
+    'Equador', 'Venezuala', 'Paraguy', 'Urugay', 'Brasil', 'Mexiko',
+    'Kenia', 'Etiopia', 'Nigera', 'Camerun', 'Sengal', 'Madagaskar',
+    'Indonesa', 'Malasia', 'Singapur', 'Tailand', 'Cambodja', 'Japn',
+    'Austrlia', 'New Zeeland', 'ger', 'fra', 'ita', 'esp',
+)
+
+
+@benchmark('search_name() misspelled names')
+def bench_search_name(size):
+
+    from geo_countries import search_name
+
+    queries = [MISSPELLED_NAMES[i % len(MISSPELLED_NAMES)]
+               for i in range(max(size // 100, len(MISSPELLED_NAMES)))]
+    search_name('warm up')
+
+    def run():
+        for query in queries:
+            search_name(query)
+
+    return len(queries), run
+
+
+# =============================================================================
+def spelled_names(size):
+    """Returns a reproducible list of names and aliases in varying case."""
+
+    import geo_countries
+
+    rnd = random.Random(42)
+    pool = [c.name for c in geo_countries._country]
+    pool.extend(alias for alias, key in geo_countries._name_aliases)
+    spellings = (str, str.lower, str.upper, str.title)
+    return [rnd.choice(spellings)(rnd.choice(pool)) for i in range(size)]
+
+
+@benchmark('country_by_name() names and aliases')
+def bench_country_by_name(size):
+
+    from geo_countries import country_by_name
+
+    names = spelled_names(max(size // 10, 1))
+    country_by_name('warm up')
+
+    def run():
+        for name in names:
+            country_by_name(name)
+
+    return len(names), run
+
+
+@benchmark('linear name scan names and aliases')
+def bench_name_scan(size):
+
+    import geo_countries
+
+    names = spelled_names(max(size // 10, 1))
+    cnt = geo_countries._country
+
+    def run():
+        for name in names:
+            name = name.casefold()
+            for c in cnt:
+                if c.name.casefold() == name:
+                    break
+
+    return len(names), run
+
+
+# =============================================================================
+@benchmark('sorted list by name: re-sort per request')
+def bench_sort_per_request(size):
+
+    import geo_countries
+    from geo_countries import _normalize_name
+
+    requests = max(size // 1000, 1)
+    cnt = geo_countries._country
+
+    def run():
+        for i in range(requests):
+            sorted(cnt, key=lambda c: (_normalize_name(c.name), c.name))
+
+    return requests, run
+
+
+@benchmark('sorted list by name: sorted_countries()')
+def bench_sorted_countries(size):
+
+    from geo_countries import sorted_countries
+
+    requests = max(size // 1000, 1)
+    sorted_countries()
+
+    def run():
+        for i in range(requests):
+            sorted_countries()
+
+    return requests, run
+
+
+@benchmark('sorted list by localized name: sorted_countries()')
+def bench_sorted_countries_locale(size):
+
+    import shutil
+    import tempfile
+    import geo_countries
+    from geo_countries import sorted_countries, compile_locale, set_locale_path
+
+    previous = geo_countries._locale_path
+    tmpdir = tempfile.mkdtemp(prefix='bench_country')
+    names = {}
+    for c in geo_countries.registry().countries:
+        if c.three_letter:
+            names[c.three_letter] = c.name[::-1].title()
+    source = os.path.join(tmpdir, 'xx.json')
+    with open(source, 'w') as f:
+        json.dump(names, f)
+    compile_locale(source, os.path.join(tmpdir, 'xx.geol'))
+    set_locale_path(tmpdir)
+    requests = max(size // 1000, 1)
+    sorted_countries(locale='xx')
+
+    def run():
+        for i in range(requests):
+            sorted_countries(locale='xx')
+
+    def cleanup():
+        set_locale_path(*(previous or ()))
+        shutil.rmtree(tmpdir)
+
+    return requests, run, cleanup
+
+
+# =============================================================================
+def typeahead_prefixes(size):
+    """Returns a reproducible list of prefixes with 1 to 3 characters."""
+
+    import geo_countries
+
+    rnd = random.Random(42)
+    names = [c.name.lower() for c in geo_countries._country]
+    prefixes = []
+    for i in range(size):
+        name = rnd.choice(names)
+        prefixes.append(name[:rnd.randint(1, 3)])
+    return prefixes
+
+
+@benchmark('prefix_search() 1-3 characters')
+def bench_prefix_search(size):
+
+    from geo_countries import prefix_search
+
+    prefixes = typeahead_prefixes(max(size // 10, 1))
+    prefix_search('warm up')
+
+    def run():
+        for prefix in prefixes:
+            prefix_search(prefix, 10)
+
+    return len(prefixes), run
+
+
+@benchmark('linear startswith scan 1-3 characters')
+def bench_prefix_scan(size):
+
+    import geo_countries
+
+    prefixes = typeahead_prefixes(max(size // 10, 1))
+    cnt = geo_countries._country
+
+    def run():
+        for prefix in prefixes:
+            [c for c in cnt if c.name.lower().startswith(prefix)][:10]
+
+    return len(prefixes), run
+
+
+# =============================================================================
+@benchmark('group by continent with regions_of() per row')
+def bench_group_regions_of(size):
+
+    from geo_countries import regions_of
+
+    keys = sample_keys(size)
+
+    def run():
+        counts = {}
+        for key in keys:
+            regions = regions_of(key)
+            region = regions[-1].numcode if regions else None
+            counts[region] = counts.get(region, 0) + 1
+        return counts
+
+    return size, run
+
+
+@benchmark('group by continent with region_of_all()')
+def bench_group_region_of_all(size):
+
+    from collections import Counter
+    from geo_countries import region_of_all
+
+    keys = sample_keys(size)
+
+    def run():
+        return Counter(region_of_all(keys))
+
+    return size, run
+
+
+@benchmark('group by continent with region_of_all() numpy')
+def bench_group_region_of_all_numpy(size):
+
+    try:
+        import numpy
+    except ImportError:
+        return None
+    from geo_countries import region_of_all
+
+    keys = numpy.array(
+        [k for k in sample_keys(size * 3) if isinstance(k, int)][:size])
+
+    def run():
+        codes = region_of_all(keys)
+        return numpy.unique(codes, return_counts=True)
+
+    return len(keys), run
+
+
+# =============================================================================
+def archive_keys(size, seed=42):
+    """Returns numeric codes with a quarter of historic ones."""
+
+    rnd = random.Random(seed)
+    historic = (278, 280, 810, 890, 720, 886, 200, 230, 582)
+    current = (276, 643, 804, 250, 840, 887, 203, 703, 231, 156)
+    return [rnd.choice(historic if rnd.random() < 0.25 else current)
+            for i in range(size)]
+
+
+@benchmark('backfill with country(resolve_historic=True)')
+def bench_resolve_historic(size):
+
+    from geo_countries import country
+
+    keys = archive_keys(size)
+
+    def run():
+        return [country(key, resolve_historic=True) for key in keys]
+
+    return size, run
+
+
+@benchmark('backfill with successors_all()')
+def bench_successors_all(size):
+
+    from geo_countries import successors_all
+
+    keys = archive_keys(size)
+
+    def run():
+        return successors_all(keys)
+
+    return size, run
+
+
+# =============================================================================
+def pool_lookup(keys):
+    """Worker of the process pool benchmarks: the registry countries."""
+
+    from geo_countries import countries
+
+    return countries(keys)
+
+
+def pool_lookup_by_value(keys):
+    """
+    Worker of the process pool benchmarks: copies of the countries, which
+    are pickled with all their data like before.
+    """
+
+    from geo_countries import countries, Country
+
+    return [None if c is None else Country(
+        c.name, c.two_letter, c.three_letter, c.numcode, c.flag)
+        for c in countries(keys)]
+
+
+def _register_pool_case(title, worker):
+
+    @benchmark('process pool results %s' % (title))
+    def bench_pool(size):
+
+        import pickle
+        from concurrent.futures import ProcessPoolExecutor
+
+        keys = sample_keys(size)
+        chunk = 10000
+        chunks = [keys[i:i + chunk] for i in range(0, len(keys), chunk)]
+        log.info("Pickled size of a chunk of %d %s: %d bytes.", chunk, title,
+                 len(pickle.dumps(worker(chunks[0]))))
+
+        def run():
+            with ProcessPoolExecutor(2) as pool:
+                for results in pool.map(worker, chunks):
+                    pass
+
+        return size, run
+
+
+_register_pool_case('by value (before)', pool_lookup_by_value)
+_register_pool_case('as references', pool_lookup)
+
+
+# =============================================================================
+def dataset_files():
+    """
+    Writes the built-in registry as CSV source and compiled cache into
+    a temporary directory and returns their paths, the caller removes
+    the directory.
+    """
+
+    import csv
+    import tempfile
+    import warnings
+    import geo_countries
+
+    tmpdir = tempfile.mkdtemp(prefix='bench_country')
+    source = os.path.join(tmpdir, 'countries.csv')
+    with open(source, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['code2', 'code3', 'numcode', 'name', 'flag'])
+        for c in geo_countries._country:
+            writer.writerow([c.two_letter, c.three_letter, c.numcode, c.name, c.flag])
+    cache = os.path.join(tmpdir, 'countries.geoc')
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        geo_countries.compile_registry(source, cache)
+    return source, cache
+
+
+def _register_cold_start(title, which):
+
+    @benchmark('cold start %s' % (title))
+    def bench_cold_start(size):
+
+        import shutil
+        import geo_countries
+
+        paths = dataset_files()
+        source = None if which is None else paths[which]
+        count = len(geo_countries._cdata)
+
+        def run():
+            geo_countries.reload(source)
+            geo_countries.country('DE')
+
+        def cleanup():
+            geo_countries.reload()
+            shutil.rmtree(os.path.dirname(paths[0]))
+
+        return count, run, cleanup
+
+
+_register_cold_start('from _cdata', None)
+_register_cold_start('from CSV source', 0)
+_register_cold_start('from compiled cache', 1)
+
+
+# =============================================================================
+def _register_threads_case(threads, reloading):
+
+    title = 'country() %d threads' % (threads)
+    if reloading:
+        title += ' during reloads'
+
+    @benchmark(title)
+    def bench_threads(size):
+
+        import threading
+        import geo_countries
+        from geo_countries import country
+
+        keys = sample_keys(size)
+        chunks = [keys[i::threads] for i in range(threads)]
+
+        def lookup(chunk):
+            for k in chunk:
+                country(k)
+
+        def run():
+            workers = [
+                threading.Thread(target=lookup, args=(chunk, ))
+                for chunk in chunks]
+            for worker in workers:
+                worker.start()
+            if reloading:
+                while any(worker.is_alive() for worker in workers):
+                    geo_countries.reload()
+            for worker in workers:
+                worker.join()
+
+        return size, run
+
+
+for _threads in (1, 2, 4):
+    _register_threads_case(_threads, False)
+_register_threads_case(4, True)
+
+
+# =============================================================================
+def low_cardinality_keys(size, distinct=40, seed=42):
+    """Returns a reproducible list of keys with only a few distinct values."""
+
+    keys = sorted(set(sample_keys(10 * distinct, seed)), key=str)
+    rnd = random.Random(seed)
+    pool = rnd.sample(keys, distinct)
+    return [rnd.choice(pool) for i in range(size)]
+
+
+# =============================================================================
+@benchmark('low cardinality: country() per row')
+def bench_validate_per_row(size):
+
+    from geo_countries import country
+
+    keys = low_cardinality_keys(size)
+
+    def run():
+        invalid = {}
+        result = []
+        for pos, key in enumerate(keys):
+            c = country(key)
+            if c is None:
+                count, first = invalid.get(key, (0, pos))
+                invalid[key] = (count + 1, first)
+            result.append(c)
+        return result, invalid
+
+    return size, run
+
+
+# =============================================================================
+@benchmark('low cardinality: validate()')
+def bench_validate(size):
+
+    from geo_countries import validate
+
+    keys = low_cardinality_keys(size)
+
+    def run():
+        return validate(keys)
+
+    return size, run
+
+
+# =============================================================================
+@benchmark('low cardinality: validate() of NumPy strings')
+def bench_validate_numpy(size):
+
+    try:
+        import numpy
+    except ImportError:
+        return None
+    from geo_countries import validate
+
+    keys = numpy.array([str(k) for k in low_cardinality_keys(size)])
+
+    def run():
+        return validate(keys)
+
+    return size, run
+
+
+# =============================================================================
+@benchmark('pandas Series.map(country) to alpha-3')
+def bench_series_map(size):
+
+    try:
+        import pandas
+    except ImportError:
+        return None
+    from geo_countries import country
+
+    series = pandas.Series(sample_keys(size))
+
+    def to_code3(key):
+        c = country(key)
+        return None if c is None else c.three_letter
+
+    def run():
+        return series.map(to_code3)
+
+    return size, run
+
+
+# =============================================================================
+@benchmark('pandas convert_series() to alpha-3')
+def bench_convert_series(size):
+
+    try:
+        import pandas
+    except ImportError:
+        return None
+    from geo_countries_columns import convert_series
+
+    series = pandas.Series([str(k) for k in sample_keys(size)])
+
+    def run():
+        return convert_series(series)
+
+    return size, run
+
+
+# =============================================================================
+@benchmark('pyarrow convert_arrow() to alpha-3')
+def bench_convert_arrow(size):
+
+    try:
+        import pyarrow
+    except ImportError:
+        return None
+    from geo_countries_columns import convert_arrow
+
+    array = pyarrow.array([str(k) for k in sample_keys(size)])
+
+    def run():
+        return convert_arrow(array)
+
+    return size, run
+
+
+# =============================================================================
+def run_benchmarks(size, repeat, pattern=None):
+    """
+    Runs all registered benchmarks and returns a list of result dicts
+    with the best time of all repetitions.
+    """
+
+    results = []
+    for name, func in BENCHMARKS:
+        if pattern and pattern not in name:
+            continue
+        prepared = func(size)
+        if prepared is None:
+            log.info("Skipping benchmark %r.", name)
+            continue
+        count, run = prepared[:2]
+        try:
+            best = min(timeit.repeat(run, number=1, repeat=repeat))
+        finally:
+            if len(prepared) > 2:
+                prepared[2]()
+        per_key = best / count * 1e9
+        results.append({
+            'name': name, 'unit': 'ns/key', 'value': per_key,
+            'count': count, 'seconds': best})
+        print("%-45s %9d keys %10.3f ms %10.1f ns/key" % (
+            name, count, best * 1000, per_key))
+
+    return results
+
+
+# =============================================================================
+IMPORT_CODE = """
+import time
+start = time.perf_counter()
+import geo_countries
+imported = time.perf_counter()
+geo_countries.country('DE')
+print(imported - start, time.perf_counter() - imported)
+"""
+
+
+def import_report(repeat):
+    """
+    Measures the import of geo_countries and the first lookup (which
+    builds the registry) in fresh interpreters and returns the best of
+    all repetitions as result dicts.
+    """
+
+    import_times = []
+    first_lookups = []
+    for i in range(repeat):
+        output = subprocess.check_output(
+            [sys.executable, '-c', IMPORT_CODE], cwd=libdir,
+            universal_newlines=True)
+        import_time, first_lookup = output.split()
+        import_times.append(float(import_time))
+        first_lookups.append(float(first_lookup))
+
+    results = []
+    for name, times in (
+            ('import geo_countries', import_times),
+            ('first lookup (registry build)', first_lookups)):
+        best = min(times)
+        results.append({
+            'name': name, 'unit': 'us', 'value': best * 1e6,
+            'count': 1, 'seconds': best})
+        print("%-45s %9s      %10.3f ms" % (name, '', best * 1000))
+
+    return results
+
+
+# =============================================================================
+class DictCountry(object):
+    """Country record with a per-instance __dict__ like the former Country."""
+
+    def __init__(self, name, two_letter, three_letter, numcode, flag):
+        self._name = name.strip()
+        self._two_letter = two_letter
+        self._three_letter = three_letter
+        self._numcode = numcode
+        self._flag = flag
+
+
+# =============================================================================
+def traced_size(build):
+    """Returns the number of bytes allocated and kept by build()."""
+
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        kept = build()                                                 # noqa
+        return tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+
+
+# =============================================================================
+def memory_report():
+    """
+    Reports the memory kept by the different record layouts and by the
+    complete registry with all lookup tables.
+    """
+
+    import geo_countries
+    from geo_countries import Country, CNT_F_REGULAR
+
+    rows = [(d[3], d[0], d[1], d[2], d[4] if len(d) > 4 else CNT_F_REGULAR)
+            for d in geo_countries._cdata]
+    geo_countries.registry()
+
+    def dict_records():
+        return [DictCountry(*row) for row in rows]
+
+    def slot_records():
+        return [Country(*row) for row in rows]
+
+    def registry():
+        geo_countries.reload()
+        geo_countries.country('DE')
+
+    results = []
+    for name, build in (
+            ('Country with __dict__ (before)', dict_records),
+            ('Country with __slots__', slot_records),
+            ('registry with lookup tables', registry)):
+        size = traced_size(build)
+        results.append({
+            'name': 'memory %s' % (name), 'unit': 'KiB',
+            'value': size / 1024.0, 'count': len(rows), 'seconds': None})
+        print("%-45s %9d rows %10.1f KiB" % (name, len(rows), size / 1024.0))
+
+    results.extend(locale_memory_report())
+    return results
+
+
+# =============================================================================
+LOCALE_MEMORY_CODE = """
+import json
+import os
+import sys
+import tracemalloc
+import geo_countries
+
+def private_kib():
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            lines = f.readlines()
+    except OSError:
+        return -1
+    return sum(int(l.split()[1]) for l in lines if l.startswith('Private_Dirty:'))
+
+tmpdir, mode, count = sys.argv[1], sys.argv[2], int(sys.argv[3])
+geo_countries.set_locale_path(tmpdir)
+all_countries = geo_countries.registry().countries
+locales = ['l%02d' % (i) for i in range(count)]
+
+private = private_kib()
+tracemalloc.start()
+if mode == 'mmap':
+    for locale in locales:
+        for c in all_countries:
+            c.localized_name(locale)
+else:
+    tables = {}
+    for locale in locales:
+        with open(os.path.join(tmpdir, locale + '.json')) as f:
+            tables[locale] = json.load(f)
+    for locale in locales:
+        for c in all_countries:
+            tables[locale].get(c.three_letter, c.name)
+traced = tracemalloc.get_traced_memory()[0]
+tracemalloc.stop()
+print(traced, private_kib() - private)
+"""
+
+LOCALE_COUNTS = (1, 10, 50)
+
+
+def locale_files():
+    """
+    Writes and compiles pseudo-localized names of all countries for the
+    locales l00..l49 into a temporary directory and returns its path.
+    """
+
+    import tempfile
+    import geo_countries
+
+    tmpdir = tempfile.mkdtemp(prefix='bench_country')
+    for i in range(max(LOCALE_COUNTS)):
+        locale = 'l%02d' % (i)
+        names = {}
+        for c in geo_countries.registry().countries:
+            if c.three_letter:
+                names[c.three_letter] = '%s [%s]' % (c.name, locale)
+        source = os.path.join(tmpdir, locale + '.json')
+        with open(source, 'w') as f:
+            json.dump(names, f)
+        geo_countries.compile_locale(
+            source, os.path.join(tmpdir, locale + '.geol'))
+    return tmpdir
+
+
+def locale_memory_report():
+    """
+    Reports the memory of a fresh process after using 1, 10 and 50 locales
+    with the memory-mapped tables and with per-locale dicts: the Python
+    heap (tracemalloc) and the growth of the private dirty pages, which
+    cannot be shared between forked workers.
+    """
+
+    import shutil
+
+    tmpdir = locale_files()
+    results = []
+    try:
+        for count in LOCALE_COUNTS:
+            for mode, title in (('mmap', 'mapped tables'), ('dict', 'per-locale dicts')):
+                output = subprocess.check_output(
+                    [sys.executable, '-c', LOCALE_MEMORY_CODE, tmpdir, mode, str(count)],
+                    cwd=libdir, universal_newlines=True)
+                traced, private = [int(v) for v in output.split()]
+                name = '%d locales %s' % (count, title)
+                results.append({
+                    'name': 'memory %s' % (name), 'unit': 'KiB',
+                    'value': traced / 1024.0, 'count': count, 'seconds': None})
+                print("%-45s %9d locs %10.1f KiB heap %8d KiB private" % (
+                    name, count, traced / 1024.0, private))
+    finally:
+        shutil.rmtree(tmpdir)
+
+    return results
+
+
+# =============================================================================
+def write_json(filename, results, args):
+
+    data = {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'machine': platform.machine(),
+        'size': args.size,
+        'repeat': args.repeat,
+        'results': results,
+    }
+    with open(filename, 'w') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+# =============================================================================
+def compare(baseline_file, results, threshold):
+    """
+    Compares the results with a baseline written with --json and prints
+    the relative change of every benchmark. Returns the names of all
+    benchmarks, which got slower (or bigger) by more than threshold
+    percent.
+    """
+
+    with open(baseline_file) as f:
+        baseline = dict(
+            (r['name'], r) for r in json.load(f)['results'])
+
+    regressions = []
+    print()
+    print("%-45s %12s %12s %9s" % ('benchmark', 'baseline', 'current', 'change'))
+    for result in results:
+        base = baseline.get(result['name'])
+        if base is None or base['unit'] != result['unit'] or not base['value']:
+            print("%-45s %12s %12.1f %9s" % (
+                result['name'], '-', result['value'], 'new'))
+            continue
+        change = (result['value'] - base['value']) / base['value'] * 100.0
+        mark = ''
+        if change > threshold:
+            mark = ' REGRESSION'
+            regressions.append(result['name'])
+        print("%-45s %12.1f %12.1f %+8.1f%%%s" % (
+            result['name'], base['value'], result['value'], change, mark))
+
+    return regressions
+
+
+# =============================================================================
+def main():
+
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument(
+        "-v", "--verbose", action="count", default=0,
+        dest='verbose', help='Increase the verbosity level')
+    arg_parser.add_argument(
+        "-n", "--size", type=int, default=100000,
+        dest='size', help='Number of keys per benchmark (default: %(default)s)')
+    arg_parser.add_argument(
+        "-r", "--repeat", type=int, default=5,
+        dest='repeat', help='Number of repetitions (default: %(default)s)')
+    arg_parser.add_argument(
+        "-k", dest='pattern',
+        help='Run only benchmarks containing this substring')
+    arg_parser.add_argument(
+        "-m", "--memory", action="store_true", dest='memory',
+        help='Report the memory footprint of the registry via tracemalloc')
+    arg_parser.add_argument(
+        "-i", "--import", action="store_true", dest='import_time',
+        help='Measure the import time and the first lookup')
+    arg_parser.add_argument(
+        "-a", "--all", action="store_true", dest='all',
+        help='Run the benchmarks, the import and the memory report')
+    arg_parser.add_argument(
+        "--json", metavar='FILE', dest='json',
+        help='Write the results as JSON into FILE')
+    arg_parser.add_argument(
+        "--compare", metavar='FILE', dest='compare',
+        help='Compare the results with a baseline written with --json')
+    arg_parser.add_argument(
+        "--threshold", type=float, default=10.0, dest='threshold',
+        help='Allowed slowdown in percent for --compare (default: %(default)s)')
+    args = arg_parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.WARNING)
+
+    results = []
+    if args.all or not (args.memory or args.import_time):
+        results.extend(run_benchmarks(args.size, args.repeat, args.pattern))
+    if args.all or args.import_time:
+        results.extend(import_report(args.repeat))
+    if args.all or args.memory:
+        results.extend(memory_report())
+
+    if args.json:
+        write_json(args.json, results, args)
+
+    if args.compare:
+        if compare(args.compare, results, args.threshold):
+            return 1
+    return 0
+
+
+# =============================================================================
+
+if __name__ == '__main__':
+
+    sys.exit(main())
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
@@ -12,6 +12,7 @@ import os
 import sys
 import logging
 import argparse
+import subprocess
 
 try:
     import unittest2 as unittest
@@ -34,6 +35,11 @@ sys.path.insert(0, libdir)
 
 log = logging.getLogger('test_country')
 
+# Number of timed runs of the import time test, the best of each is compared:
+# the own import time of geo_countries must stay below the time of building
+# the registry afterwards, which an eager import would include.
+IMPORT_TIME_RUNS = 3
+
 
 # =============================================================================
 def get_arg_verbose():
@@ -116,6 +122,1239 @@ class CountryTestcase(unittest.TestCase):
         log.info("Testing import of geo_countries ...")
         import geo_countries                                            # noqa
 
+    # -------------------------------------------------------------------------
+    def test_import_time(self):
+
+        log.info("Testing import time of geo_countries ...")
+        import shutil
+        import tempfile
+        import geo_countries
+
+        code = (
+            "import time\n"
+            "import geo_countries\n"
+            "assert geo_countries._registry is None, 'registry was built'\n"
+            "start = time.perf_counter()\n"
+            "geo_countries.registry()\n"
+            "print(int((time.perf_counter() - start) * 1000000))\n")
+
+        # Compiling the module is no part of the import time, so a discarded
+        # first run writes the byte code into a private cache for the others
+        env = dict(os.environ)
+        env.pop('PYTHONDONTWRITEBYTECODE', None)
+        cwd = os.path.dirname(os.path.abspath(geo_countries.__file__))
+        tmpdir = tempfile.mkdtemp()
+        args = [sys.executable, '-X', 'pycache_prefix=' + tmpdir,
+                '-X', 'importtime', '-c', code]
+
+        import_times = []
+        build_times = []
+        try:
+            for i in range(IMPORT_TIME_RUNS + 1):
+                proc = subprocess.Popen(
+                    args, cwd=cwd, env=env,
+                    stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                    universal_newlines=True)
+                (stdout, stderr) = proc.communicate()
+                self.assertEqual(proc.returncode, 0, stderr)
+                if not i:
+                    continue
+
+                for line in stderr.splitlines():
+                    fields = [f.strip() for f in line.split('|')]
+                    if len(fields) == 3 and fields[2] == 'geo_countries':
+                        import_times.append(int(fields[0].split()[-1]))
+                self.assertEqual(len(import_times), i, stderr)
+                build_times.append(int(stdout))
+        finally:
+            shutil.rmtree(tmpdir)
+
+        log.debug(
+            "Import time: %d us, building the registry: %d us.",
+            min(import_times), min(build_times))
+        self.assertLess(min(import_times), min(build_times))
+
+        self.assertEqual(len(geo_countries._country), len(geo_countries._cdata))
+
+    # -------------------------------------------------------------------------
+    def test_country(self):
+
+        log.info("Testing lookup with country() ...")
+        from geo_countries import country
+        from geo_countries import CNT_F_REGULAR, CNT_F_OLD, CNT_F_REGION
+
+        for key in (276, '276', ' 276 ', '0276', 276.0, 'DE', 'de', ' De ',
+                    'DEU', 'deu', 'dEu', '\tDEU\n'):
+            c = country(key)
+            self.assertIsNotNone(c, "Key %r not found." % (key))
+            self.assertEqual(c.name, 'Germany')
+
+        for key in (999, '999', 'XX', 'xxx', '', ' ', '2__76', 'Germany'):
+            self.assertIsNone(country(key), "Key %r was found." % (key))
+
+        self.assertEqual(country(4).two_letter, 'AF')
+        self.assertEqual(country('004').two_letter, 'AF')
+        self.assertEqual(country(810).flag, CNT_F_OLD)
+        self.assertIsNone(country(810, CNT_F_REGULAR))
+        self.assertIsNone(country('DE', CNT_F_REGION))
+        self.assertEqual(country(150, CNT_F_REGION).name, 'Europe')
+
+        with self.assertRaises(ValueError):
+            country('DE', 0x08)
+
+    # -------------------------------------------------------------------------
+    def test_flag_indexes(self):
+
+        log.info("Testing the lookup tables per flags ...")
+        from geo_countries import country, countries, convert, convert_all
+        from geo_countries import all_countries, iter_countries, registry
+        from geo_countries import CNT_I_COUNTRY
+        from geo_countries import CNT_F_REGULAR, CNT_F_OLD, CNT_F_REGION, CNT_F_ANY
+
+        for numcode, current, old in (
+                (104, 'Myanmar', 'Burma'), (180, 'Democratic Republic of the Congo', 'Zaire'),
+                (384, "Côte d'Ivoire", 'Ivory Coast')):
+            self.assertEqual(country(numcode).name, current)
+            self.assertEqual(country(numcode, CNT_F_REGULAR).name, current)
+            self.assertEqual(country(numcode, CNT_F_OLD).name, old)
+            self.assertEqual(country(' %d ' % (numcode), CNT_F_OLD).name, old)
+            self.assertEqual(country(b'%03d' % (numcode), CNT_F_OLD).name, old)
+            self.assertIsNone(country(numcode, CNT_F_REGION))
+            self.assertEqual(convert(numcode, CNT_I_COUNTRY, CNT_F_OLD), old)
+            self.assertEqual(convert(str(numcode), CNT_I_COUNTRY, CNT_F_OLD), old)
+            self.assertEqual(
+                convert_all([numcode, '0%d' % (numcode)], CNT_I_COUNTRY, CNT_F_OLD),
+                [old, old])
+            self.assertEqual(countries([numcode], CNT_F_OLD)[0].name, old)
+
+        self.assertEqual(country(278, CNT_F_OLD).name, 'German Democratic Republic')
+        self.assertIsNone(country('DE', CNT_F_OLD))
+        self.assertEqual(country(150, CNT_F_REGION).name, 'Europe')
+
+        every = all_countries()
+        self.assertIsInstance(every, tuple)
+        self.assertEqual(every, registry().countries)
+        total = 0
+        for flags in (CNT_F_REGULAR, CNT_F_OLD, CNT_F_REGION):
+            selected = all_countries(flags)
+            self.assertIs(selected, all_countries(flags))
+            self.assertTrue(all(c.flag == flags for c in selected))
+            self.assertEqual(list(iter_countries(flags)), list(selected))
+            total += len(selected)
+        self.assertEqual(total, len(all_countries(CNT_F_ANY)))
+        self.assertIn(country('DE'), all_countries(CNT_F_REGULAR))
+        with self.assertRaises(ValueError):
+            all_countries(0x08)
+
+    # -------------------------------------------------------------------------
+    def test_pickle(self):
+
+        log.info("Testing pickling of countries as registry references ...")
+        import copy
+        import json
+        import pickle
+        import shutil
+        import tempfile
+        from concurrent.futures import ProcessPoolExecutor
+        from geo_countries import country, reload
+        from geo_countries import Country, CNT_F_OLD
+
+        germany = country('DE')
+        data = pickle.dumps(germany)
+        self.assertLess(len(data), 80)
+        self.assertIs(pickle.loads(data), germany)
+        self.assertIs(copy.deepcopy(germany), germany)
+        zaire = country(180, CNT_F_OLD)
+        self.assertIs(pickle.loads(pickle.dumps(zaire)), zaire)
+        europe = country(150)
+        self.assertIs(pickle.loads(pickle.dumps(europe, protocol=2)), europe)
+
+        other = Country('Atlantis', 'XA', 'XAT', 999)
+        clone = pickle.loads(pickle.dumps(other))
+        self.assertIsNot(clone, other)
+        self.assertEqual(
+            (clone.name, clone.two_letter, clone.three_letter, clone.numcode, clone.flag),
+            ('Atlantis', 'XA', 'XAT', 999, other.flag))
+
+        with ProcessPoolExecutor(1) as pool:
+            results = list(pool.map(country, ['DE', 'fra', 180]))
+        self.assertEqual(results, [germany, country('FR'), country(180)])
+        self.assertIs(results[0], germany)
+
+        tmpdir = tempfile.mkdtemp()
+        try:
+            source = os.path.join(tmpdir, 'countries.json')
+            with open(source, 'w') as f:
+                json.dump([{'code2': 'FR', 'code3': 'FRA', 'numcode': 250, 'name': 'France'}], f)
+            reload(source)
+            with self.assertRaises(ValueError):
+                pickle.loads(data)
+        finally:
+            reload()
+            shutil.rmtree(tmpdir)
+
+    # -------------------------------------------------------------------------
+    def test_validate(self):
+
+        log.info("Testing bulk validation of country keys ...")
+        from geo_countries import country, validate, Validator, InvalidValue
+        from geo_countries import CNT_I_CODE2, CNT_I_COUNTRY
+        from geo_countries import CNT_F_OLD, CNT_F_REGULAR
+
+        germany = country('DE')
+        keys = ['DE', 'xx', 276, None, ' fr ', 'xx', b'DEU',
+                bytearray(b'zz'), 'de', 'xx', 999]
+        result, report = validate(keys, chunk_size=4)
+        self.assertEqual(len(result), len(keys))
+        self.assertIs(result[0], germany)
+        self.assertIs(result[2], germany)
+        self.assertIs(result[4], country('FR'))
+        self.assertIsNone(result[1])
+        self.assertIsNone(result[10])
+        self.assertEqual(report, {
+            'xx': (3, 1), None: (1, 3), b'zz': (1, 7), 999: (1, 10)})
+        self.assertIsInstance(report['xx'], InvalidValue)
+        self.assertEqual((report['xx'].count, report['xx'].first), (3, 1))
+
+        result, report = validate(['DE', 278], CNT_F_REGULAR, CNT_I_COUNTRY)
+        self.assertEqual(result, ['Germany', None])
+        self.assertEqual(report, {278: (1, 1)})
+        result, report = validate(['DE', 278], CNT_F_OLD, CNT_I_COUNTRY)
+        self.assertEqual(result, [None, 'German Democratic Republic'])
+
+        # many invalid values in one chunk
+        keys = ['x%d' % (i % 20) for i in range(100)] + ['DE']
+        result, report = validate(keys, to=CNT_I_CODE2, chunk_size=30)
+        self.assertEqual(result[-1], 'DE')
+        self.assertEqual(len(report), 20)
+        self.assertEqual(report['x3'], (5, 3))
+
+        validator = Validator(to=CNT_I_CODE2)
+        self.assertEqual(validator.feed(['DE', 'xx']), ['DE', None])
+        self.assertEqual(validator.feed(['xx', 'FRA']), [None, 'FR'])
+        self.assertEqual(validator.rows, 4)
+        self.assertEqual(validator.invalid, {'xx': (2, 1)})
+
+        # all NaN values are one distinct value together with None
+        validator = Validator()
+        result = validator.feed([276.0, float('nan')] * 500 + [None])
+        self.assertIs(result[0], germany)
+        self.assertEqual(len(validator._memo), 2)
+        self.assertEqual(validator.invalid, {None: (501, 1)})
+
+        result, report = validate(['DE', float('inf'), float('-inf')])
+        self.assertEqual(result, [germany, None, None])
+        self.assertEqual(report, {float('inf'): (1, 1), float('-inf'): (1, 2)})
+
+        with self.assertRaises(ValueError):
+            validate(['DE'], 0)
+
+    # -------------------------------------------------------------------------
+    def test_validate_numpy(self):
+
+        log.info("Testing bulk validation of NumPy arrays ...")
+
+        try:
+            import numpy
+        except ImportError:
+            self.skipTest("NumPy is not available.")
+        from geo_countries import country, validate, CNT_I_CODE2
+
+        germany = country('DE')
+        array = numpy.array(['DE', 'xx', 'FRA', 'xx', '276'])
+        result, report = validate(array, to=CNT_I_CODE2)
+        self.assertEqual(result.tolist(), ['DE', None, 'FR', None, 'DE'])
+        self.assertEqual(report, {'xx': (2, 1)})
+        result, report = validate(numpy.array([999, 276, 999]))
+        self.assertIs(result[1], germany)
+        self.assertEqual(report, {999: (2, 0)})
+        result, report = validate(numpy.array([276.0, numpy.nan, numpy.nan]))
+        self.assertIs(result[0], germany)
+        self.assertEqual(report, {None: (2, 1)})
+
+        # mixed objects cannot be sorted by numpy.unique()
+        array = numpy.array(['DE', None, 'xx', None, numpy.nan], dtype=object)
+        result, report = validate(array, to=CNT_I_CODE2, chunk_size=2)
+        self.assertEqual(result.tolist(), ['DE', None, None, None, None])
+        self.assertEqual(report, {None: (3, 1), 'xx': (1, 2)})
+
+        try:
+            import pandas
+        except ImportError:
+            return
+        keys = ['DE', pandas.NA, 'xx', None, float('nan')]
+        result, report = validate(keys, to=CNT_I_CODE2)
+        self.assertEqual(result, ['DE', None, None, None, None])
+        self.assertEqual(report, {None: (3, 1), 'xx': (1, 2)})
+        series = pandas.Series(['DE', None, 'FRA', None], dtype='string')
+        result, report = validate(series, to=CNT_I_CODE2)
+        self.assertEqual(result, ['DE', None, 'FR', None])
+        self.assertEqual(report, {None: (2, 1)})
+        result, report = validate(
+            pandas.Series(['DE', None]).to_numpy(), to=CNT_I_CODE2)
+        self.assertEqual(result.tolist(), ['DE', None])
+        self.assertEqual(report, {None: (1, 1)})
+
+    # -------------------------------------------------------------------------
+    def test_bytes_keys(self):
+
+        log.info("Testing lookup with bytes, bytearray and memoryview keys ...")
+        import mmap
+        import tempfile
+        import geo_countries
+        from geo_countries import country, countries, convert, convert_all
+        from geo_countries import scan_codes, CNT_I_CODE2, CNT_F_REGULAR
+
+        germany = country('DE')
+        for key in (b'DE', b'de', b' De ', b'DEU', b'deu', b'276', b'0276',
+                    b'\t276\n', bytearray(b'DE'), memoryview(b'deu'),
+                    memoryview(bytearray(b' 276 ')), memoryview(b'xDEUx')[1:4]):
+            self.assertIs(country(key), germany, "Key %r not found." % (key, ))
+
+        for key in (b'', b'XX', b'Germany', b'999', bytearray(b'xxx')):
+            self.assertIsNone(country(key), "Key %r was found." % (key, ))
+        self.assertIsNone(country(b'278', CNT_F_REGULAR))
+        with self.assertRaises(TypeError):
+            country([276])
+
+        keys = [b'FR', bytearray(b'fra'), memoryview(b'250'), b'xx']
+        self.assertEqual(
+            [c and c.name for c in countries(keys)],
+            ['France', 'France', 'France', None])
+        self.assertEqual(convert(bytearray(b'deu'), CNT_I_CODE2), 'DE')
+        self.assertEqual(convert_all(keys), ['FRA', 'FRA', 'FRA', None])
+        for key in geo_countries.registry()._cache:
+            self.assertNotIsInstance(key, (bytearray, memoryview))
+
+        records = b'DEU 276|fr  250|XXX 999|de  000|'
+        offsets = range(0, len(records), 8)
+        expected = [germany, country('FR'), None, germany]
+        self.assertEqual(scan_codes(records, offsets, 3), expected)
+        self.assertEqual(scan_codes(bytearray(records), offsets, 3), expected)
+        self.assertEqual(
+            scan_codes(records, range(4, len(records), 8), 3, as_index=True)[:2],
+            countries([276, 250], as_index=True))
+
+        with tempfile.TemporaryFile() as f:
+            f.write(records)
+            f.flush()
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                self.assertEqual(scan_codes(buf, offsets, 3), expected)
+            finally:
+                buf.close()
+
+    # -------------------------------------------------------------------------
+    def test_cache(self):
+
+        log.info("Testing the cache of raw keys ...")
+        import geo_countries
+        from geo_countries import country, cache_info, cache_clear
+        from geo_countries import set_cache_size, CNT_F_REGION
+
+        try:
+            set_cache_size(2)
+            country('DE')
+            self.assertEqual(cache_info().misses, 0)
+
+            self.assertEqual(country(' De ').name, 'Germany')
+            self.assertEqual(country(' De ').name, 'Germany')
+            self.assertIsNone(country(' De ', CNT_F_REGION))
+            self.assertIsNone(country('nowhere'))
+            self.assertIsNone(country('nowhere'))
+            info = cache_info()
+            self.assertEqual((info.hits, info.misses), (3, 2))
+            self.assertEqual((info.maxsize, info.currsize), (2, 2))
+
+            country(' fr ')
+            self.assertEqual(cache_info().currsize, 2)
+            self.assertNotIn(' De ', geo_countries.registry()._cache)
+
+            cache_clear()
+            self.assertEqual(tuple(cache_info()), (0, 0, 2, 0))
+
+            set_cache_size(0)
+            self.assertEqual(country(' De ').name, 'Germany')
+            self.assertEqual(tuple(cache_info()), (0, 0, 0, 0))
+
+            with self.assertRaises(ValueError):
+                set_cache_size(-1)
+        finally:
+            set_cache_size()
+
+    # -------------------------------------------------------------------------
+    def test_country_codes(self):
+
+        log.info("Testing the code tuples of country_codes() ...")
+        from geo_countries import country, country_codes, country_codes_all
+        from geo_countries import CNT_I_CODE2, CNT_I_CODE3, CNT_I_NUMCODE
+        from geo_countries import CNT_I_COUNTRY, CNT_I_FLAG, CNT_F_OLD
+
+        codes = country_codes(666)
+        self.assertEqual(codes, ('PM', 'SPM', 666, 'Saint Pierre and Miquelon', 1))
+        self.assertIs(country_codes(' pm '), codes)
+        self.assertIs(country_codes(b'SPM'), codes)
+        self.assertIs(country_codes('666'), codes)
+
+        germany = country('DE')
+        codes = country_codes('DE')
+        self.assertEqual(codes[CNT_I_CODE2], germany.two_letter)
+        self.assertEqual(codes[CNT_I_CODE3], germany.three_letter)
+        self.assertEqual(codes[CNT_I_NUMCODE], germany.numcode)
+        self.assertEqual(codes[CNT_I_COUNTRY], germany.name)
+        self.assertEqual(codes[CNT_I_FLAG], germany.flag)
+
+        self.assertEqual(country_codes(180, CNT_F_OLD), (None, None, 180, 'Zaire', 2))
+        self.assertIsNone(country_codes('xx'))
+        self.assertIsNone(country_codes(999))
+
+        result = country_codes_all(['DE', 'xx', 276, bytearray(b'de')])
+        self.assertIs(result[0], codes)
+        self.assertIsNone(result[1])
+        self.assertIs(result[2], codes)
+        self.assertIs(result[3], codes)
+        self.assertIs(country_codes(memoryview(bytearray(b' de '))), codes)
+        with self.assertRaises(TypeError):
+            country_codes(['DE'])
+        with self.assertRaises(ValueError):
+            country_codes_all(['DE'], 0)
+
+        try:
+            import numpy
+        except ImportError:
+            return
+        result = country_codes_all(numpy.array([276, 999]))
+        self.assertEqual(result, [codes, None])
+
+    # -------------------------------------------------------------------------
+    def test_convert(self):
+
+        log.info("Testing direct code conversion with convert() ...")
+        from geo_countries import country, convert, convert_all
+        from geo_countries import field_attribute
+        from geo_countries import CNT_I_CODE2, CNT_I_CODE3, CNT_I_NUMCODE
+        from geo_countries import CNT_I_COUNTRY, CNT_F_REGULAR, CNT_F_OLD
+
+        self.assertEqual(convert('DE'), 'DEU')
+        self.assertEqual(convert(' de '), 'DEU')
+        self.assertEqual(convert(276, CNT_I_CODE2), 'DE')
+        self.assertEqual(convert('deu', CNT_I_NUMCODE), 276)
+        self.assertEqual(convert('004', CNT_I_COUNTRY), 'Afghanistan')
+        self.assertIsNone(convert('AQ'))
+        self.assertIsNone(convert(' aq '))
+        self.assertIsNone(convert(bytearray(b'AQ')))
+        self.assertEqual(convert('AQ', CNT_I_CODE2), 'AQ')
+        self.assertIsNone(convert('810', CNT_I_CODE2))
+        self.assertIsNone(convert(999))
+        self.assertIsNone(convert(1000))
+        self.assertIsNone(convert('xx'))
+        self.assertIsNone(convert(810, CNT_I_COUNTRY, CNT_F_REGULAR))
+        self.assertEqual(convert(810, CNT_I_NUMCODE, CNT_F_OLD), 810)
+
+        keys = ['DE', 276, ' fra ', 'xx', 'AQ', 810]
+        for to in (CNT_I_CODE2, CNT_I_CODE3, CNT_I_NUMCODE, CNT_I_COUNTRY):
+            expected = []
+            for key in keys:
+                c = country(key, CNT_F_REGULAR)
+                expected.append(None if c is None else convert(key, to))
+            self.assertEqual(convert_all(keys, to, CNT_F_REGULAR), expected)
+
+        with self.assertRaises(ValueError):
+            convert('DE', 5)
+        with self.assertRaises(ValueError):
+            convert('DE', CNT_I_CODE3, 0)
+
+        self.assertEqual(field_attribute(CNT_I_CODE3), 'three_letter')
+        self.assertEqual(field_attribute(CNT_I_COUNTRY), 'name')
+        with self.assertRaises(ValueError):
+            field_attribute(5)
+
+    # -------------------------------------------------------------------------
+    def test_search_name(self):
+
+        log.info("Testing fuzzy name search with search_name() ...")
+        from geo_countries import search_name, CNT_F_REGULAR, CNT_F_OLD
+
+        for query, code in (
+                ('Viet nam', 'VN'), ('Cote d Ivoire', 'CI'), ('Tanzania', 'TZ'),
+                ('Germny', 'DE'), ('swizerland', 'CH'), ('IRAN', 'IR')):
+            result = search_name(query)
+            self.assertTrue(result, "Nothing found for %r." % (query))
+            self.assertEqual(result[0][0].two_letter, code)
+
+        result = search_name("Côte d'Ivoire", limit=2)
+        self.assertEqual(len(result), 2)
+        self.assertEqual(result[0][1], 1.0)
+        self.assertGreater(result[0][1], result[1][1])
+
+        result = search_name('Ivory Coast', flags=CNT_F_OLD)
+        self.assertTrue(all(c.flag == CNT_F_OLD for c, score in result))
+        self.assertEqual(result[0][0].numcode, 384)
+        self.assertEqual(
+            search_name('Ivory Coast', 1, CNT_F_REGULAR)[0][0].two_letter, 'CI')
+
+        self.assertEqual(search_name(''), [])
+        self.assertEqual(search_name('...'), [])
+        self.assertEqual(search_name('Germany', limit=0), [])
+
+    # -------------------------------------------------------------------------
+    def test_country_by_name(self):
+
+        log.info("Testing exact name lookup with country_by_name() ...")
+        from geo_countries import country, country_by_name, _name_aliases
+        from geo_countries import CNT_F_REGULAR, CNT_F_OLD, CNT_F_REGION
+
+        for name, code in (
+                ('Germany', 'DE'), ('  germany ', 'DE'), ("Côte d'Ivoire", 'CI'),
+                ('COTE D IVOIRE', 'CI'), ('Reunion', 'RE'),
+                ('Micronesia, Federated States of', 'FM'),
+                ('Federated States of Micronesia', 'FM'), ('Iran', 'IR'),
+                ('falkland islands', 'FK'), ('Cocos Islands', 'CC'),
+                ('North Korea', 'KP'), ('Russia', 'RU'), ('UK', 'GB')):
+            c = country_by_name(name)
+            self.assertIsNotNone(c, "Name %r not found." % (name))
+            self.assertEqual(c.two_letter, code)
+
+        for alias, key in _name_aliases:
+            c = country_by_name(alias, CNT_F_REGULAR)
+            self.assertIs(c, country(key, CNT_F_REGULAR), "Alias %r." % (alias))
+
+        self.assertEqual(country_by_name('Burma').flag, CNT_F_OLD)
+        self.assertEqual(country_by_name('Burma', CNT_F_REGULAR).name, 'Myanmar')
+        self.assertEqual(country_by_name('Zaire', CNT_F_OLD).numcode, 180)
+        self.assertEqual(country_by_name('Micronesia').flag, CNT_F_REGION)
+        self.assertIsNone(country_by_name('Germany', CNT_F_OLD))
+        self.assertIsNone(country_by_name('Germny'))
+        self.assertIsNone(country_by_name(''))
+        with self.assertRaises(ValueError):
+            country_by_name('Germany', 0)
+
+    # -------------------------------------------------------------------------
+    def test_prefix_search(self):
+
+        log.info("Testing typeahead with prefix_search() ...")
+        from geo_countries import prefix_search, CNT_F_REGULAR, CNT_F_REGION
+
+        result = prefix_search('de', 3)
+        self.assertEqual(len(result), 3)
+        self.assertEqual(result[0].name, 'Germany')
+        self.assertTrue(result[1].name.lower().startswith('de'))
+
+        names = [c.name for c in prefix_search('United S')]
+        self.assertEqual(names[0], 'United States')
+        self.assertTrue(all(name.startswith('United States') for name in names))
+
+        self.assertEqual(prefix_search('COTE')[0].two_letter, 'CI')
+        self.assertIn('KR', [c.two_letter for c in prefix_search('kor')])
+
+        result = prefix_search('g', 50, CNT_F_REGULAR)
+        self.assertEqual(len(result), len(set(result)))
+        self.assertTrue(all(c.flag == CNT_F_REGULAR for c in result))
+        self.assertNotIn(
+            'German Democratic Republic', [c.name for c in result])
+
+        self.assertEqual(prefix_search('eur', 1, CNT_F_REGION)[0].name, 'Europe')
+        self.assertEqual(prefix_search('xq'), [])
+        self.assertEqual(prefix_search(''), [])
+
+    # -------------------------------------------------------------------------
+    def test_regions(self):
+
+        log.info("Testing the M49 region hierarchy ...")
+        from geo_countries import country, countries_in_region, subregions
+        from geo_countries import regions_of, region_of_all, CNT_F_REGION
+
+        europe = countries_in_region(150)
+        self.assertIn(country('DE'), europe)
+        self.assertIn(country('RU'), europe)
+        self.assertNotIn(country('US'), europe)
+        self.assertNotIn(country(155), europe)
+        self.assertIs(europe, countries_in_region('150'))
+        self.assertEqual(
+            sorted(c.two_letter for c in countries_in_region(155)),
+            ['AT', 'BE', 'CH', 'DE', 'FR', 'LI', 'LU', 'MC', 'NL'])
+        self.assertIsNone(countries_in_region('DE'))
+        self.assertIsNone(countries_in_region(999))
+
+        self.assertEqual(
+            [r.numcode for r in subregions(150)], [151, 154, 39, 155])
+        self.assertEqual(subregions(155), ())
+
+        self.assertEqual([r.numcode for r in regions_of('DE')], [155, 150])
+        self.assertEqual([r.numcode for r in regions_of('BR')], [5, 419, 19])
+        self.assertEqual([r.numcode for r in regions_of(57)], [55, 9])
+        self.assertEqual(regions_of('AQ'), ())
+        self.assertIsNone(regions_of('xx'))
+        self.assertIsNone(regions_of('DE', CNT_F_REGION))
+
+        keys = ['DE', 'US', 156, 'xx', 'AQ', 150, 'BR']
+        self.assertEqual(
+            region_of_all(keys), [150, 19, 142, None, None, 150, 19])
+        self.assertEqual(
+            region_of_all(keys, (419, 150)),
+            [150, None, None, None, None, 150, 419])
+        with self.assertRaises(ValueError):
+            region_of_all(keys, ('DE', ))
+
+        try:
+            import numpy
+        except ImportError:
+            return
+        self.assertEqual(
+            region_of_all(numpy.array([276, 840, 999])).tolist(), [150, 19, -1])
+
+    # -------------------------------------------------------------------------
+    def test_historic(self):
+
+        log.info("Testing the resolution of historic countries ...")
+        from geo_countries import country, successors, predecessors
+        from geo_countries import successors_all, CNT_F_OLD, CNT_F_REGULAR
+
+        germany = country('DE')
+        self.assertEqual(country(278).flag, CNT_F_OLD)
+        self.assertIs(country(278, resolve_historic=True), germany)
+        self.assertIs(country(280, CNT_F_OLD, resolve_historic=True), germany)
+        self.assertIsNone(country(278, CNT_F_REGULAR, resolve_historic=True))
+        self.assertIs(country('DE', resolve_historic=True), germany)
+
+        ussr = country(810, resolve_historic=True)
+        self.assertIsInstance(ussr, tuple)
+        self.assertEqual(ussr[0].two_letter, 'RU')
+        self.assertIn(country('UA'), ussr)
+        self.assertEqual(
+            set(c.two_letter for c in country(200, resolve_historic=True)),
+            set(('CZ', 'SK')))
+
+        # Successors missing in the registry
+        self.assertEqual(country(532, resolve_historic=True).numcode, 532)
+
+        self.assertEqual(successors(720), (country('YE'), ))
+        self.assertEqual(successors('FR'), (country('FR'), ))
+        self.assertIsNone(successors('xx'))
+        self.assertEqual(
+            set(c.numcode for c in predecessors('DE')), set((278, 280)))
+        self.assertEqual(predecessors('FR'), ())
+
+        self.assertEqual(
+            successors_all([278, 'xx', 'FR']),
+            [(germany, ), None, (country('FR'), )])
+
+    # -------------------------------------------------------------------------
+    def test_reload(self):
+
+        log.info("Testing external datasets and the binary cache ...")
+        import csv
+        import json
+        import shutil
+        import tempfile
+        import warnings
+        import geo_countries
+        from geo_countries import country, reload
+        from geo_countries import compile_registry, CNT_F_OLD
+
+        tmpdir = tempfile.mkdtemp()
+        try:
+            source = os.path.join(tmpdir, 'countries.csv')
+            with open(source, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow(['code2', 'code3', 'numcode', 'name', 'flag'])
+                writer.writerow(['DE', 'DEU', '276', 'Germany', ''])
+                writer.writerow(['', '', '278', 'German Democratic Republic', 'old'])
+                writer.writerow(['XK', 'XKX', '', 'Kosovo', '1'])
+                writer.writerow(['RE', 'REU', '638', 'Réunion', ''])
+                writer.writerow(['XD', 'DEU', '', 'Duplicate', ''])
+
+            target = os.path.join(tmpdir, 'countries.geoc')
+            with warnings.catch_warnings(record=True) as caught:
+                warnings.simplefilter('always')
+                self.assertEqual(compile_registry(source, target), 5)
+            self.assertEqual(
+                [str(w.message) for w in caught],
+                ["Three letter code 'deu' already exists."])
+
+            reload(target)
+            self.assertEqual(len(geo_countries._country), 5)
+            self.assertEqual(country('deu').name, 'Germany')
+            self.assertEqual(country(278).flag, CNT_F_OLD)
+            self.assertIsNone(country('XK').numcode)
+            self.assertEqual(country(638).name, 'Réunion')
+            self.assertIsNone(country('FR'))
+            self.assertEqual(geo_countries._country[3].name, 'Réunion')
+            self.assertEqual(geo_countries.registry().lookup['deu'], 0)
+
+            with open(target, 'r+b') as f:
+                f.seek(60)
+                f.write(b'\xff\xff\xff')
+                f.truncate(70)
+            with self.assertRaises(ValueError):
+                reload(target)
+            self.assertEqual(country('deu').name, 'Germany')
+
+            for values, message in (
+                    (['DEU', 'DEU', '276', 'Germany', ''], "2-letter code 'DEU' in row 1"),
+                    (['DE', 'DEÜ', '276', 'Germany', ''], "3-letter code 'DEÜ' in row 1"),
+                    (['DE', 'D1', '276', 'Germany', ''], "3-letter code 'D1' in row 1"),
+                    (['DE', 'DEU', '40000', 'Germany', ''], "numeric code '40000' in row 1"),
+                    (['DE', 'DEU', '-1', 'Germany', ''], "numeric code '-1' in row 1"),
+                    (['DE', 'DEU', 'x', 'Germany', ''], "numeric code 'x' in row 1"),
+                    (['DE', 'DEU', '276', 'Germany', 'new'], "flag 'new'")):
+                bad = os.path.join(tmpdir, 'bad.csv')
+                with open(bad, 'w', newline='', encoding='utf-8') as f:
+                    writer = csv.writer(f)
+                    writer.writerow(['code2', 'code3', 'numcode', 'name', 'flag'])
+                    writer.writerow(values)
+                with self.assertRaises(ValueError) as cm:
+                    compile_registry(bad, target)
+                self.assertIn(message, str(cm.exception))
+
+            data = [{'code2': 'XA', 'numcode': 999, 'name': 'Testland'}]
+            with open(os.path.join(tmpdir, 'c.json'), 'w') as f:
+                json.dump(data, f)
+            reload(os.path.join(tmpdir, 'c.json'))
+            self.assertEqual(country(999).two_letter, 'XA')
+            self.assertIsNone(country('DE'))
+
+            # The duplicate of the source is reported once again on compiling
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                cache = os.path.join(tmpdir, 'cache.geoc')
+                reload(source, cache=cache)
+                self.assertTrue(os.path.exists(cache))
+                self.assertEqual(country(276).name, 'Germany')
+                with open(source, 'a', newline='', encoding='utf-8') as f:
+                    f.write('FR,FRA,250,France,\n')
+                reload(source, cache=cache)
+                self.assertEqual(country('FR').name, 'France')
+
+                with open(source, 'a', encoding='utf-8') as f:
+                    f.write(',,,,\n')
+                with self.assertRaises(ValueError):
+                    reload(source)
+                self.assertEqual(country('FR').name, 'France')
+        finally:
+            reload()
+            shutil.rmtree(tmpdir)
+
+        self.assertEqual(len(geo_countries._country), len(geo_countries._cdata))
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            reload()
+        self.assertEqual(caught, [])
+
+    # -------------------------------------------------------------------------
+    def test_reload_concurrent(self):
+
+        log.info("Testing lookups running concurrently to reload() ...")
+        import json
+        import shutil
+        import tempfile
+        import threading
+        import geo_countries
+        from geo_countries import country, convert, registry, reload
+
+        # the snapshot cannot be changed in place
+        reg = registry()
+        for index in (reg.two_letter, reg.three_letter, reg.numeric, reg.lookup,
+                      geo_countries._numeric, geo_countries._lookup):
+            with self.assertRaises(TypeError):
+                index['xx'] = 0
+        with self.assertRaises(TypeError):
+            reg.countries[0] = None
+        self.assertFalse(hasattr(reg, 'lookups'))
+        self.assertIsNone(country('xx'))
+
+        tmpdir = tempfile.mkdtemp()
+        source = os.path.join(tmpdir, 'countries.json')
+        data = [{'code2': 'X%s' % (chr(65 + i)), 'numcode': 900 + i,
+                 'name': 'Filler %d' % (i)} for i in range(20)]
+        data.append({'code2': 'DE', 'code3': 'DEB', 'numcode': 276, 'name': 'Deutschland'})
+        with open(source, 'w') as f:
+            json.dump(data, f)
+
+        stop = threading.Event()
+        errors = []
+        lookups = [0]
+
+        def reader():
+            try:
+                while not stop.is_set():
+                    c = country('de')
+                    if c is None or c.name not in ('Germany', 'Deutschland'):
+                        errors.append(('country', c))
+                    if convert(276) not in ('DEU', 'DEB'):
+                        errors.append(('convert', convert(276)))
+                    reg = registry()
+                    c = reg.countries[reg.lookup['DE']]
+                    if c is not reg.countries[reg.numeric[276]]:
+                        errors.append(('registry', c))
+                    lookups[0] += 1
+            except Exception as e:
+                errors.append(('exception', e))
+
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-05)
+        threads = [threading.Thread(target=reader) for i in range(4)]
+        try:
+            for thread in threads:
+                thread.start()
+            for i in range(30):
+                reload(source if i % 2 == 0 else None)
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+            sys.setswitchinterval(interval)
+            reload()
+            shutil.rmtree(tmpdir)
+
+        self.assertEqual(errors, [])
+        self.assertGreater(lookups[0], 0)
+        self.assertIsInstance(registry().countries, tuple)
+        self.assertEqual(len(geo_countries._country), len(geo_countries._cdata))
+
+    # -------------------------------------------------------------------------
+    def test_localized_name(self):
+
+        log.info("Testing localized names ...")
+        import json
+        import shutil
+        import tempfile
+        import warnings
+        from geo_countries import country, compile_locale
+        from geo_countries import set_locale_path, loaded_locales
+        from geo_countries import localized_country
+        from geo_countries import CNT_F_REGULAR, CNT_F_OLD
+
+        tmpdir = tempfile.mkdtemp()
+        try:
+            source = os.path.join(tmpdir, 'de.csv')
+            with open(source, 'w', encoding='utf-8') as f:
+                f.write('key,name\nDE,Deutschland\nciv,Elfenbeinküste\n')
+                f.write('810,Sowjetunion\n150,Europa\nxx,Nirgendwo\n')
+            with warnings.catch_warnings(record=True) as caught:
+                warnings.simplefilter('always')
+                self.assertEqual(
+                    compile_locale(source, os.path.join(tmpdir, 'de.geol')), 4)
+            self.assertEqual([str(w.message) for w in caught], ["Unknown country 'xx'."])
+
+            source = os.path.join(tmpdir, 'pt_BR.json')
+            with open(source, 'w') as f:
+                json.dump({'DE': 'Alemanha'}, f)
+            compile_locale(source, os.path.join(tmpdir, 'pt_BR.geol'))
+
+            set_locale_path(tmpdir)
+            self.assertEqual(loaded_locales(), ())
+            germany = country('DE')
+            self.assertEqual(germany.localized_name('de'), 'Deutschland')
+            self.assertEqual(germany.localized_name('de-AT'), 'Deutschland')
+            self.assertEqual(germany.localized_name('de_CH.UTF-8'), 'Deutschland')
+            self.assertEqual(germany.localized_name('pt_BR'), 'Alemanha')
+            self.assertEqual(germany.localized_name('pt'), 'Germany')
+            self.assertEqual(germany.localized_name('fr'), 'Germany')
+            self.assertEqual(country('CI').localized_name('de'), 'Elfenbeinküste')
+            self.assertEqual(country(810).localized_name('de'), 'Sowjetunion')
+            self.assertEqual(country('FR').localized_name('de'), 'France')
+            self.assertEqual(loaded_locales(), ('de', 'pt_BR'))
+
+            self.assertIs(localized_country('Deutschland', 'de'), germany)
+            self.assertIs(localized_country(' ELFENBEINKUSTE', 'de'), country('CI'))
+            self.assertIs(localized_country('Alemanha', 'pt_BR'), germany)
+            self.assertIsNone(localized_country('Sowjetunion', 'de', CNT_F_REGULAR))
+            self.assertIsNone(localized_country('Germany', 'de'))
+            self.assertIsNone(localized_country('Deutschland', 'fr'))
+
+            # countries without 3-letter code and historic numeric codes
+            source = os.path.join(tmpdir, 'fr.csv')
+            with open(source, 'w', encoding='utf-8') as f:
+                f.write('key,name\nAQ,Antarctique\nCC,Îles Cocos\n')
+                f.write('180,République démocratique du Congo\nold:180,Zaïre\n')
+                f.write('OLD:104,Birmanie\nregion:150,Europe\n')
+            with warnings.catch_warnings(record=True) as caught:
+                warnings.simplefilter('always')
+                self.assertEqual(
+                    compile_locale(source, os.path.join(tmpdir, 'fr.geol')), 6)
+            self.assertEqual(caught, [])
+            set_locale_path(tmpdir)
+            self.assertEqual(country('AQ').localized_name('fr'), 'Antarctique')
+            self.assertEqual(country('CC').localized_name('fr'), 'Îles Cocos')
+            self.assertEqual(
+                country(180).localized_name('fr'), 'République démocratique du Congo')
+            self.assertEqual(country(180, CNT_F_OLD).localized_name('fr'), 'Zaïre')
+            self.assertEqual(country(104, CNT_F_OLD).localized_name('fr'), 'Birmanie')
+            self.assertEqual(country(104).localized_name('fr'), 'Myanmar')
+            self.assertIs(localized_country('zaire', 'fr'), country(180, CNT_F_OLD))
+            self.assertIs(localized_country('Antarctique', 'fr'), country('AQ'))
+            self.assertIsNone(localized_country('Zaïre', 'fr', CNT_F_REGULAR))
+
+            with open(os.path.join(tmpdir, 'it.geol'), 'wb') as f:
+                f.write(b'GEOC')
+            with self.assertRaises(ValueError):
+                germany.localized_name('it')
+        finally:
+            set_locale_path()
+            shutil.rmtree(tmpdir)
+
+        self.assertEqual(country('DE').localized_name('de'), 'Germany')
+
+    # -------------------------------------------------------------------------
+    def test_sorted_countries(self):
+
+        log.info("Testing the cached sort orders of sorted_countries() ...")
+        import json
+        import shutil
+        import tempfile
+        from geo_countries import sorted_countries, all_countries
+        from geo_countries import compile_locale, set_locale_path
+        from geo_countries import CNT_I_CODE2, CNT_I_NUMCODE, CNT_I_COUNTRY
+        from geo_countries import CNT_F_REGULAR, CNT_F_REGION
+
+        result = sorted_countries(flags=CNT_F_REGULAR)
+        self.assertIsInstance(result, tuple)
+        self.assertIs(sorted_countries(CNT_I_COUNTRY, CNT_F_REGULAR), result)
+        self.assertEqual(set(result), set(all_countries(CNT_F_REGULAR)))
+        names = [c.name for c in result]
+        self.assertLess(names.index('Costa Rica'), names.index("Côte d'Ivoire"))
+        self.assertLess(names.index("Côte d'Ivoire"), names.index('Croatia'))
+        self.assertLess(names.index('Republic of Moldova'), names.index('Réunion'))
+        self.assertLess(names.index('Réunion'), names.index('Romania'))
+
+        codes = [c.two_letter for c in sorted_countries(CNT_I_CODE2)]
+        self.assertEqual(codes[0], 'AD')
+        present = [code for code in codes if code is not None]
+        self.assertEqual(present, sorted(present))
+        self.assertEqual(codes[len(present):], [None] * (len(codes) - len(present)))
+
+        numcodes = [c.numcode for c in sorted_countries(CNT_I_NUMCODE, CNT_F_REGION)]
+        self.assertEqual(numcodes, sorted(numcodes))
+        self.assertIs(
+            sorted_countries(CNT_I_NUMCODE, locale='de'), sorted_countries(CNT_I_NUMCODE))
+
+        with self.assertRaises(ValueError):
+            sorted_countries(9)
+        with self.assertRaises(ValueError):
+            sorted_countries(flags=0)
+
+        tmpdir = tempfile.mkdtemp()
+        try:
+            source = os.path.join(tmpdir, 'de.json')
+            with open(source, 'w') as f:
+                json.dump({'DE': 'Deutschland', 'AT': 'Österreich', 'CH': 'Schweiz'}, f)
+            compile_locale(source, os.path.join(tmpdir, 'de.geol'))
+
+            english = sorted_countries(flags=CNT_F_REGULAR, locale='de')
+            self.assertEqual(english, result)
+            set_locale_path(tmpdir)
+            german = sorted_countries(flags=CNT_F_REGULAR, locale='de')
+            self.assertIs(sorted_countries(flags=CNT_F_REGULAR, locale='de'), german)
+            names = [c.localized_name('de') for c in german]
+            self.assertLess(names.index('Deutschland'), names.index('Dominica'))
+            self.assertLess(names.index('Oman'), names.index('Österreich'))
+            self.assertLess(names.index('Österreich'), names.index('Pakistan'))
+            self.assertLess(names.index('Saudi Arabia'), names.index('Schweiz'))
+        finally:
+            set_locale_path()
+            shutil.rmtree(tmpdir)
+
+        self.assertEqual(sorted_countries(flags=CNT_F_REGULAR, locale='de'), result)
+
+    # -------------------------------------------------------------------------
+    def run_cli(self, args, data):
+
+        import geo_countries
+
+        proc = subprocess.Popen(
+            [sys.executable, '-m', 'geo_countries'] + args,
+            cwd=os.path.dirname(os.path.abspath(geo_countries.__file__)),
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE, universal_newlines=True)
+        stdout, stderr = proc.communicate(data)
+        return proc.returncode, stdout, stderr
+
+    # -------------------------------------------------------------------------
+    def test_cli(self):
+
+        log.info("Testing the command line interface ...")
+        import json
+
+        data = 'id,land\n1,DE\n2,"x,y"\n3,276\n4, fr \n'
+        returncode, stdout, stderr = self.run_cli(['-c', 'land'], data)
+        self.assertEqual(returncode, 0, stderr)
+        self.assertEqual(stdout.splitlines(), [
+            'id,land,code2,code3,numcode,name',
+            '1,DE,DE,DEU,276,Germany',
+            '2,"x,y",,,,',
+            '3,276,DE,DEU,276,Germany',
+            '4, fr ,FR,FRA,250,France',
+        ])
+        self.assertIn('4 rows, 1 misses', stderr)
+
+        data = ''.join('%d\t%s\n' % (i, ('DE', 'us', 'xx')[i % 3])
+                       for i in range(1000))
+        args = ['-f', 'tsv', '--no-header', '-c', '1', '-q', '--chunk-size', '64']
+        returncode, serial, stderr = self.run_cli(args, data)
+        self.assertEqual(returncode, 0, stderr)
+        returncode, parallel, stderr = self.run_cli(args + ['-j', '2'], data)
+        self.assertEqual(returncode, 0, stderr)
+        self.assertEqual(parallel, serial)
+        self.assertEqual(len(serial.splitlines()), 1000)
+
+        # TSV knows no quotes, fields with tabs are escaped on output
+        data = 'a\tb\n1\t"DE\n2\tFR\n3\tx\\y\n'
+        returncode, stdout, stderr = self.run_cli(['-f', 'tsv', '-c', 'b'], data)
+        self.assertEqual(returncode, 0, stderr)
+        self.assertEqual(stdout.splitlines(), [
+            'a\tb\tcode2\tcode3\tnumcode\tname',
+            '1\t"DE\t\t\t\t',
+            '2\tFR\tFR\tFRA\t250\tFrance',
+            '3\tx\\\\y\t\t\t\t',
+        ])
+        self.assertIn('3 rows, 2 misses', stderr)
+
+        data = '{"k": "DE"}\n\n{"x": 1}\n'
+        returncode, stdout, stderr = self.run_cli(
+            ['-f', 'jsonl', '-c', 'k', '--flags', 'regular'], data)
+        self.assertEqual(returncode, 0, stderr)
+        lines = [json.loads(line) for line in stdout.splitlines()]
+        self.assertEqual(lines[0]['code3'], 'DEU')
+        self.assertIsNone(lines[1]['name'])
+        self.assertIn('2 rows, 1 misses', stderr)
+
+        data = '{"k": {"a": 1}}\n{"k": [1, 2]}\n{"k": 1e400}\n{"k": 276}\n'
+        returncode, stdout, stderr = self.run_cli(['-f', 'jsonl', '-c', 'k'], data)
+        self.assertEqual(returncode, 0, stderr)
+        lines = [json.loads(line) for line in stdout.splitlines()]
+        self.assertEqual([line['code2'] for line in lines], [None, None, None, 'DE'])
+        self.assertIn('4 rows, 3 misses', stderr)
+
+        for data, message in (
+                ('{"k": "DE"}\n\n[1, 2]\n', '<stdin>, line 3: no JSON object.'),
+                ('{"k": "DE"}\n{"k": \n', '<stdin>, line 2: invalid JSON')):
+            returncode, stdout, stderr = self.run_cli(['-f', 'jsonl', '-c', 'k'], data)
+            self.assertEqual(returncode, 1)
+            self.assertIn(message, stderr)
+            self.assertNotIn('Traceback', stderr)
+
+        returncode, stdout, stderr = self.run_cli(['-c', 'zz'], 'a,b\n1,2\n')
+        self.assertEqual(returncode, 1)
+
+        returncode, stdout, stderr = self.run_cli(
+            ['-c', 'b', '-o', os.path.join(os.sep, 'nonexistent', 'x.csv')],
+            'a,b\n1,2\n')
+        self.assertEqual(returncode, 1)
+        self.assertIn('No such file or directory', stderr)
+        self.assertNotIn('Traceback', stderr)
+
+    # -------------------------------------------------------------------------
+    def test_bench_compare(self):
+
+        log.info("Testing JSON output and compare mode of the benchmarks ...")
+        import json
+        import shutil
+        import tempfile
+
+        bench = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_country.py')
+        tmpdir = tempfile.mkdtemp()
+        try:
+            baseline = os.path.join(tmpdir, 'baseline.json')
+            args = [sys.executable, bench, '-k', 'country() int', '-n', '100', '-r', '1']
+            subprocess.check_output(args + ['--json', baseline])
+            with open(baseline) as f:
+                data = json.load(f)
+            names = [r['name'] for r in data['results']]
+            self.assertEqual(names, ['country() int hit', 'country() int miss'])
+            self.assertEqual(data['results'][0]['unit'], 'ns/key')
+
+            proc = subprocess.Popen(
+                args + ['--compare', baseline, '--threshold', '100000'],
+                stdout=subprocess.PIPE, universal_newlines=True)
+            stdout = proc.communicate()[0]
+            self.assertEqual(proc.returncode, 0, stdout)
+            self.assertNotIn('REGRESSION', stdout)
+
+            data['results'][0]['value'] = 1e-06
+            with open(baseline, 'w') as f:
+                json.dump(data, f)
+            proc = subprocess.Popen(
+                args + ['--compare', baseline], stdout=subprocess.PIPE,
+                universal_newlines=True)
+            stdout = proc.communicate()[0]
+            self.assertEqual(proc.returncode, 1, stdout)
+            self.assertIn('REGRESSION', stdout)
+        finally:
+            shutil.rmtree(tmpdir)
+
+    # -------------------------------------------------------------------------
+    def test_convert_series(self):
+
+        try:
+            import pandas
+        except ImportError:
+            self.skipTest("pandas is not available.")
+
+        log.info("Testing conversion of pandas Series ...")
+        from geo_countries import CNT_I_CODE2, CNT_I_NUMCODE, CNT_I_COUNTRY
+        from geo_countries_columns import convert_series
+
+        series = pandas.Series(
+            ['DE', 'deu', None, 'xx', '276', ' fr ', 'xx'],
+            index=list('abcdefg'), name='land')
+        result, unmapped = convert_series(series)
+        self.assertEqual(list(result.index), list(series.index))
+        self.assertEqual(result.name, 'land')
+        self.assertEqual(result['a'], 'DEU')
+        self.assertEqual(result['f'], 'FRA')
+        self.assertTrue(pandas.isna(result['c']))
+        self.assertTrue(pandas.isna(result['d']))
+        self.assertEqual(unmapped, {'xx': 2})
+
+        result, unmapped = convert_series(series, CNT_I_NUMCODE)
+        self.assertEqual(str(result.dtype), 'Int64')
+        self.assertEqual(result['e'], 276)
+
+        names = pandas.Series(['Germany', 'france', None, 'DE'])
+        result, unmapped = convert_series(
+            names, CNT_I_CODE2, source=CNT_I_COUNTRY)
+        self.assertEqual(list(result[:2]), ['DE', 'FR'])
+        self.assertEqual(unmapped, {'DE': 1})
+
+    # -------------------------------------------------------------------------
+    def test_convert_arrow(self):
+
+        try:
+            import pyarrow
+        except ImportError:
+            self.skipTest("pyarrow is not available.")
+
+        log.info("Testing conversion of pyarrow arrays ...")
+        from geo_countries import CNT_I_NUMCODE, CNT_I_COUNTRY
+        from geo_countries_columns import convert_arrow
+
+        array = pyarrow.chunked_array([['DE', None, 'xx'], ['US', 'US', 'xx']])
+        result, unmapped = convert_arrow(array, CNT_I_NUMCODE)
+        self.assertEqual(result.type, pyarrow.int32())
+        self.assertEqual(result.to_pylist(), [276, None, None, 840, 840, None])
+        self.assertEqual(unmapped, {'xx': 2})
+
+        result, unmapped = convert_arrow(
+            pyarrow.array(['276', None]).dictionary_encode(), CNT_I_COUNTRY)
+        self.assertEqual(result.to_pylist(), ['Germany', None])
+        self.assertEqual(unmapped, {})
+
+    # -------------------------------------------------------------------------
+    def test_stats(self):
+
+        log.info("Testing the instrumentation of country() ...")
+        import pickle
+        import geo_countries
+        from geo_countries import country, enable_stats, disable_stats
+        from geo_countries import stats, stats_prometheus, CNT_F_REGULAR
+
+        self.assertFalse(stats()['enabled'])
+        germany = country('DE')
+        enable_stats(sample_every=1)
+        try:
+            for key in (276, '276', 'DE', ' de ', 'deu', 'xx', 'ABCD', 278):
+                country(key, CNT_F_REGULAR)
+            self.assertEqual(country(278, resolve_historic=True).name, 'Germany')
+            data = stats()
+            # pickling is no lookup of the application
+            self.assertIs(pickle.loads(pickle.dumps(germany)), germany)
+            self.assertEqual(stats()['lookups'], data['lookups'])
+        finally:
+            disable_stats()
+
+        self.assertTrue(data['enabled'])
+        self.assertEqual(data['lookups']['numeric'], {'hit': 3, 'miss': 0, 'filtered': 1})
+        self.assertEqual(data['lookups']['alpha2'], {'hit': 2, 'miss': 1, 'filtered': 0})
+        self.assertEqual(data['lookups']['alpha3'], {'hit': 1, 'miss': 0, 'filtered': 0})
+        self.assertEqual(data['lookups']['other'], {'hit': 0, 'miss': 1, 'filtered': 0})
+        self.assertEqual(data['fallbacks'], 4)
+        self.assertEqual(data['latency']['count'], 9)
+        self.assertEqual(data['latency']['buckets'][-1], (None, 9))
+
+        country('DE')
+        self.assertFalse(stats()['enabled'])
+        self.assertEqual(stats()['lookups']['alpha2']['hit'], 2)
+
+        text = stats_prometheus()
+        self.assertIn(
+            'geo_countries_lookups_total{path="alpha2",outcome="miss"} 1\n', text)
+        self.assertIn('geo_countries_lookup_fallbacks_total 4\n', text)
+        self.assertIn('geo_countries_lookup_seconds_bucket{le="+Inf"} 9\n', text)
+        self.assertIn('geo_countries_lookup_seconds_count 9\n', text)
+        self.assertIn('# TYPE geo_countries_cache_currsize gauge\n', text)
+
+        enable_stats(sample_every=0)
+        country('DE')
+        disable_stats()
+        self.assertIsNone(stats()['latency'])
+        self.assertEqual(stats()['lookups']['alpha2']['hit'], 1)
+        self.assertNotIn('_lookup_seconds', stats_prometheus())
+        with self.assertRaises(ValueError):
+            enable_stats(sample_every=-1)
+        self.assertFalse(geo_countries._stats_enabled)
+
+    # -------------------------------------------------------------------------
+    def test_country_slots(self):
+
+        log.info("Testing the slots of Country ...")
+        from geo_countries import Country
+
+        c = Country('Nowhere', 'XN', 'XNW', 999)
+        self.assertFalse(hasattr(c, '__dict__'))
+        with self.assertRaises(AttributeError):
+            c.capital = 'Nowhere City'
+
+    # -------------------------------------------------------------------------
+    def test_countries(self):
+
+        log.info("Testing bulk lookup with countries() ...")
+        from geo_countries import country, countries
+        from geo_countries import CNT_F_REGULAR, CNT_F_REGION
+
+        keys = ['DE', 'deu', ' 276 ', 276, 'xx', 999, 2]
+        result = countries(keys)
+        self.assertEqual(result, [country(key) for key in keys])
+        self.assertEqual(result[0].name, 'Germany')
+        self.assertIsNone(result[4])
+
+        indexes = countries(keys, as_index=True)
+        self.assertEqual(indexes[0], indexes[3])
+        self.assertEqual(indexes[4], -1)
+        self.assertEqual(indexes[5], -1)
+
+        self.assertEqual(
+            countries(keys, CNT_F_REGULAR, as_index=True)[-1], -1)
+        self.assertEqual(countries(keys, CNT_F_REGION)[-1].name, 'Africa')
+
+        with self.assertRaises(ValueError):
+            countries(keys, 0x10)
+
+    # -------------------------------------------------------------------------
+    def test_countries_numpy(self):
+
+        try:
+            import numpy
+        except ImportError:
+            self.skipTest("NumPy is not available.")
+
+        log.info("Testing vectorized bulk lookup with countries() ...")
+        from geo_countries import countries, CNT_F_REGULAR
+
+        keys = [276, 180, 999, -5, 2, 1000, 104]
+        arr = numpy.array(keys, dtype=numpy.int32)
+
+        indexes = countries(arr, as_index=True)
+        self.assertIsInstance(indexes, numpy.ndarray)
+        self.assertEqual(indexes.tolist(), countries(keys, as_index=True))
+        self.assertEqual(
+            countries(arr, CNT_F_REGULAR, as_index=True).tolist(),
+            countries(keys, CNT_F_REGULAR, as_index=True))
+        self.assertEqual(countries(arr), countries(keys))
+
+        grid = arr[:6].reshape(2, 3)
+        self.assertEqual(countries(grid, as_index=True).shape, (2, 3))
+
 
 
 # =============================================================================
@@ -132,6 +1371,33 @@ if __name__ == '__main__':
     suite = unittest.TestSuite()
 
     suite.addTest(CountryTestcase('test_import', verbose))
+    suite.addTest(CountryTestcase('test_import_time', verbose))
+    suite.addTest(CountryTestcase('test_country', verbose))
+    suite.addTest(CountryTestcase('test_flag_indexes', verbose))
+    suite.addTest(CountryTestcase('test_pickle', verbose))
+    suite.addTest(CountryTestcase('test_bytes_keys', verbose))
+    suite.addTest(CountryTestcase('test_cache', verbose))
+    suite.addTest(CountryTestcase('test_convert', verbose))
+    suite.addTest(CountryTestcase('test_search_name', verbose))
+    suite.addTest(CountryTestcase('test_country_by_name', verbose))
+    suite.addTest(CountryTestcase('test_prefix_search', verbose))
+    suite.addTest(CountryTestcase('test_regions', verbose))
+    suite.addTest(CountryTestcase('test_historic', verbose))
+    suite.addTest(CountryTestcase('test_reload', verbose))
+    suite.addTest(CountryTestcase('test_reload_concurrent', verbose))
+    suite.addTest(CountryTestcase('test_localized_name', verbose))
+    suite.addTest(CountryTestcase('test_cli', verbose))
+    suite.addTest(CountryTestcase('test_bench_compare', verbose))
+    suite.addTest(CountryTestcase('test_convert_series', verbose))
+    suite.addTest(CountryTestcase('test_convert_arrow', verbose))
+    suite.addTest(CountryTestcase('test_stats', verbose))
+    suite.addTest(CountryTestcase('test_country_slots', verbose))
+    suite.addTest(CountryTestcase('test_countries', verbose))
+    suite.addTest(CountryTestcase('test_countries_numpy', verbose))
+    suite.addTest(CountryTestcase('test_validate', verbose))
+    suite.addTest(CountryTestcase('test_validate_numpy', verbose))
+    suite.addTest(CountryTestcase('test_country_codes', verbose))
+    suite.addTest(CountryTestcase('test_sorted_countries', verbose))
 
     runner = unittest.TextTestRunner(verbosity=verbose)
 